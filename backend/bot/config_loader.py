@@ -1,6 +1,8 @@
 # config_loader.py
 import json
-from types import SimpleNamespace
+from dataclasses import dataclass
+from functools import cache
+from typing import Optional, Tuple
 from pathlib import Path
 
 DEFAULT_CFG = {
@@ -22,24 +24,68 @@ DEFAULT_CFG = {
     "MT5_SERVER": None,
     "VERBOSE": True,
     "FETCH_BARS": 100,
-    "MIN_STOP_DISTANCE": 0.1
+    "MIN_STOP_DISTANCE": 0.1,
+    "LARGE_CANDLE_THRESHOLD_USD": 7.0,
+    "LIMIT_PULLBACK_PCT": 0.30,
+    "LIMIT_PENDING_MAX_WAIT_SECONDS": 1800,
+    "LIMIT_PENDING_POLL_INTERVAL": 5,
+    "TRAIL_TRIGGER_RR": 2.0,
+    "REDUCED_RISK_USD": 3.0,
+    "BACKEND_URL": None,
+    "BACKEND_API_KEY": None
 }
 
+
+@dataclass(frozen=True, slots=True)
+class Config:
+    """
+    Immutable run configuration. Unknown keys in config.json fail at construction.
+    Values never change at runtime, so modules cast the ones they use per tick once at import.
+    """
+    SYMBOL: str
+    TIMEFRAME_ENTRY: str
+    TIMEFRAME_TREND: str
+    EMAS_TREND: Tuple[int, ...]
+    SL_DISTANCE_USD: float
+    TP_DISTANCE_USD: float
+    RISK_PCT: float
+    MIN_LOT: float
+    LOT_STEP: float
+    DEFAULT_VOLUME: float
+    DRY_RUN: bool
+    MAGIC: int
+    LOG_FILE: str
+    MT5_LOGIN: Optional[int]
+    MT5_PASSWORD: Optional[str]
+    MT5_SERVER: Optional[str]
+    VERBOSE: bool
+    FETCH_BARS: int
+    MIN_STOP_DISTANCE: float
+    LARGE_CANDLE_THRESHOLD_USD: float
+    LIMIT_PULLBACK_PCT: float
+    LIMIT_PENDING_MAX_WAIT_SECONDS: int
+    LIMIT_PENDING_POLL_INTERVAL: int
+    TRAIL_TRIGGER_RR: float
+    REDUCED_RISK_USD: float
+    BACKEND_URL: Optional[str]
+    BACKEND_API_KEY: Optional[str]
+
+
 def load_config(path: str = "config.json"):
-    p = Path(path)
-    if p.exists():
-        with open(p, "r") as f:
-            cfg_dict = json.load(f)
-    else:
-        cfg_dict = DEFAULT_CFG
-    # fill missing keys
-    for k, v in DEFAULT_CFG.items():
-        if k not in cfg_dict:
-            cfg_dict[k] = v
-    # ensure types
-    cfg_dict["EMAS_TREND"] = [int(x) for x in cfg_dict.get("EMAS_TREND", [9,20,50])]
-    cfg = SimpleNamespace(**cfg_dict)
+    # resolve first so "config.json" and "./config.json" share one cache entry
+    return _load_config_resolved(Path(path).resolve())
+
+@cache
+def _load_config_resolved(p: Path):
+    # defaults first, file values override (fills missing keys in one merge)
+    cfg_dict = {**DEFAULT_CFG, **(json.loads(p.read_text()) if p.exists() else {})}
+    # ensure types (tuple so the frozen config stays hashable)
+    cfg_dict["EMAS_TREND"] = tuple(int(x) for x in cfg_dict["EMAS_TREND"])
+    cfg = Config(**cfg_dict)
     return cfg
 
+# tests can call load_config.cache_clear() to force a re-read
+load_config.cache_clear = _load_config_resolved.cache_clear
+
 # single config instance (import config_loader.config)
 config = load_config()
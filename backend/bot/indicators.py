@@ -1,5 +1,69 @@
 # indicators.py
+from functools import lru_cache
+import numpy as np
 import pandas as pd
 
+try:  # optional: compiles the scalar kernels (EMAs below, strategy._decide); without it they run as plain Python
+    from numba import njit, types
+except ImportError:
+    njit = None
+
+
+def njit_if_available(signature):
+    """
+    njit(signature, cache=True) when numba is installed, else the plain function.
+    The pinned signature compiles at import (or loads the on-disk cache), so the first
+    market tick after a restart doesn't pay the JIT cost.
+    """
+    def wrap(fn):
+        return njit(signature, cache=True)(fn) if njit is not None else fn
+    return wrap
+
 def ema(series: pd.Series, period: int) -> pd.Series:
     return series.ewm(span=period, adjust=False).mean()
+
+def ema_next(prev_ema: float, value: float, period: int) -> float:
+    """One-bar EMA update; matches the last value of ema() (adjust=False) extended by `value`."""
+    alpha = 2.0 / (period + 1)
+    return alpha * value + (1.0 - alpha) * prev_ema
+
+# closes may arrive as read-only views (pandas copy-on-write) -> pin both array flavours
+_EMAS_SIGS = None if njit is None else [
+    types.float64[::1](arr_t, types.float64[::1])
+    for arr_t in (types.float64[::1], types.Array(types.float64, 1, "C", readonly=True))
+]
+
+@njit_if_available(_EMAS_SIGS)
+def _emas_last_kernel(arr, alphas):
+    # one pass over the closes, K accumulators updated per value
+    K = alphas.size
+    s = np.empty(K)
+    for k in range(K):
+        s[k] = arr[0]
+    for i in range(1, arr.size):
+        c = arr[i]
+        for k in range(K):
+            s[k] = alphas[k] * c + (1.0 - alphas[k]) * s[k]
+    return s
+
+@lru_cache(maxsize=16)
+def _alphas(periods):
+    return 2.0 / (np.asarray(periods, dtype=np.float64) + 1.0)
+
+def emas_last(values, periods) -> np.ndarray:
+    """Last EMA value for each of `periods` (adjust=False) in a single pass; nan if empty."""
+    periods = tuple(int(p) for p in periods)
+    # contiguous float64 to match the kernel's pinned signature (DataFrame columns may be strided)
+    arr = np.ascontiguousarray(values, dtype=np.float64)
+    if arr.size == 0:
+        return np.full(len(periods), np.nan)
+    alphas = _alphas(periods)
+    if njit is None:
+        # the interpreter is much faster on Python floats than on numpy scalars
+        coeffs = [(a, 1.0 - a) for a in alphas.tolist()]
+        xs = arr.tolist()
+        s = [xs[0]] * len(coeffs)
+        for x in xs[1:]:
+            s = [a * x + b * v for (a, b), v in zip(coeffs, s)]
+        return np.array(s)
+    return _emas_last_kernel(arr, alphas)
@@ -1,13 +1,15 @@
 # run_loop.py
 import time
+import random
 import logging
-from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from datetime import datetime, timezone
 
 # imports assume files are in same folder
-import scan_ema            # provides scan_once(), log_positions_summary(), get_open_positions()
-from mt5_utils import initialize_mt5, shutdown_mt5, fetch_bars, ensure_symbol
+import scan_ema            # provides scan_once(), log_positions_summary(), iter_open_positions()
+from mt5_utils import initialize_mt5, shutdown_mt5, fetch_last_bar_time, ensure_symbol
 from config_loader import config
-from position_manager import monitor_position_by_symbol  # blocking monitor you wrote
+from position_manager import monitor_position_by_symbol, clear_cancel, MonitorCancelled  # blocking monitor you wrote
 
 # Setup simple logging for the loop
 logger = logging.getLogger("swingpilot.run_loop")
@@ -20,7 +22,13 @@ if not logger.handlers:
     logger.addHandler(ch)
 
 
+# retry backoff for MT5 outages: 5s, 10s, 20s, ... capped at 5 min
+_BACKOFF_MIN = 5
+_BACKOFF_MAX = 300
+
+
 # --- Dynamically parse timeframe ---
+@lru_cache(maxsize=16)
 def timeframe_to_minutes(tf: str) -> int:
     tf = tf.upper().strip()
     if tf.startswith("M"):
@@ -32,38 +40,37 @@ def timeframe_to_minutes(tf: str) -> int:
     raise ValueError(f"Unsupported timeframe: {tf}")
 
 
-def next_candle_boundary(ts: datetime, interval_minutes: int) -> datetime:
-    ts = ts.replace(second=0, microsecond=0)
-    minute = ts.minute
-    remainder = minute % interval_minutes
-    next_minute = minute - remainder + interval_minutes
-    if next_minute >= 60:
-        # advance hour
-        next_time = ts.replace(minute=0) + timedelta(hours=1)
-    else:
-        next_time = ts.replace(minute=next_minute)
-    return next_time
+# entry timeframe is fixed for the process -> resolve once
+_INTERVAL_MIN = timeframe_to_minutes(config.TIMEFRAME_ENTRY)
+_INTERVAL_SEC = _INTERVAL_MIN * 60
 
 
-def pd_time_to_datetime(value):
-    """Convert pandas.Timestamp or datetime to UTC datetime."""
-    try:
-        dt = value.to_pydatetime()
-    except Exception:
-        dt = value
-    if dt.tzinfo is None:
-        return dt.replace(tzinfo=timezone.utc)
-    return dt.astimezone(timezone.utc)
+def next_boundary_epoch(now_ts: float, interval_sec: int) -> int:
+    """Epoch seconds of the first candle boundary strictly after now_ts (works for any interval, e.g. M7)."""
+    return (int(now_ts) // interval_sec + 1) * interval_sec
+
+
+def candle_deadline(candle_time: datetime, buffer_seconds: float, min_wait: float, now_ts: float) -> float:
+    """
+    Absolute epoch wake-up for the candle after `candle_time`: its close + buffer,
+    but never sooner than `min_wait` seconds after `now_ts` (boundary already passed).
+    """
+    deadline = next_boundary_epoch(candle_time.timestamp(), _INTERVAL_SEC) + buffer_seconds
+    return max(deadline, now_ts + min_wait)
+
+
+def _iso(epoch: float) -> str:
+    return datetime.fromtimestamp(epoch, tz=timezone.utc).isoformat()
 
 
 def main_loop():
     symbol = config.SYMBOL
     timeframe = config.TIMEFRAME_ENTRY  # e.g. "M5", "M15", "H1"
-    interval_minutes = timeframe_to_minutes(timeframe)
+    interval_minutes = _INTERVAL_MIN
     safety_buffer_seconds = 5  # to ensure candle closed
     poll_interval_for_monitor = 30 # used when invoking monitor_position_by_symbol
 
-    logger.info(f"Starting SwingPilot loop for timeframe {timeframe} ({interval_minutes} min candles)")
+    logger.info("Starting SwingPilot loop for timeframe %s (%s min candles)", timeframe, interval_minutes)
 
     initialize_mt5()
 
@@ -74,103 +81,102 @@ def main_loop():
     try:
         ensure_symbol(symbol)
     except Exception as e:
-        logger.exception(f"ensure_symbol failed: {e}")
+        logger.exception("ensure_symbol failed: %s", e)
 
+    clear_cancel()  # a cancel from a previous run must not stop this one
     last_seen = None
+    backoff = _BACKOFF_MIN
+    next_deadline = 0.0  # absolute epoch wake-up time; 0 -> run the first iteration immediately
 
     try:
         while True:
             try:
-                df = fetch_bars(symbol, timeframe, count=2)
-                if df is None or len(df) < 1:
-                    logger.warning("No bars returned; sleeping 30s and retrying.")
-                    time.sleep(30)
+                # sleep to an absolute deadline so wake-ups don't drift by the time spent processing
+                dt = next_deadline - time.time()
+                if dt > 0:
+                    time.sleep(dt)
+                # one clock read per iteration; refreshed only after blocking calls (scan/monitor)
+                now_ts = time.time()
+                late = now_ts - next_deadline
+                if next_deadline and late > 2 * _INTERVAL_SEC:
+                    # e.g. host suspended; the fetch below already returns the newest candle, so just realign
+                    logger.warning("Woke %ss past the scheduled deadline; realigning to the newest %s candle.", int(late), timeframe)
+
+                # polling only needs the newest bar time -> no DataFrame
+                last_time = fetch_last_bar_time(symbol, timeframe)
+                if last_time is None:
+                    logger.warning("No bars returned; retrying in ~%ss.", backoff)
+                    next_deadline = now_ts + backoff + random.uniform(0, backoff / 4)
+                    backoff = min(backoff * 2, _BACKOFF_MAX)
                     continue
 
-                last_time = pd_time_to_datetime(df['time'].iloc[-1])
-
                 # First-run initialization
                 if last_seen is None:
                     last_seen = last_time
-                    logger.info(f"Initial detected last {timeframe} candle: {last_seen.isoformat()}")
+                    logger.info("Initial detected last %s candle: %s", timeframe, last_seen.isoformat())
 
                     # If there is already an open position on startup, immediately monitor it
-                    open_pos = scan_ema.get_open_positions(symbol)
+                    open_pos = scan_ema.iter_open_positions(symbol)
                     if open_pos:
-                        logger.info(f"Found existing open position(s) at startup ({len(open_pos)}). Entering monitor immediately.")
-                        scan_ema.log_positions_summary(symbol)
+                        logger.info("Found existing open position(s) at startup (%s). Entering monitor immediately.", len(open_pos))
+                        scan_ema.log_positions_summary(symbol, open_pos)
                         monitor_position_by_symbol(symbol, poll_interval=poll_interval_for_monitor)
                         logger.info("Existing position(s) closed. Resuming candle-sync.")
                         # after monitor returns, refresh last_seen (get newest candle time)
-                        df = fetch_bars(symbol, timeframe, count=2)
-                        last_seen = pd_time_to_datetime(df['time'].iloc[-1])
-                        # compute next boundary and sleep
-                        next_boundary = next_candle_boundary(last_seen, interval_minutes)
-                        sleep_for = (next_boundary - datetime.now(timezone.utc)).total_seconds() + safety_buffer_seconds
-                        sleep_for = max(sleep_for, 5)
-                        logger.info(f"Sleeping until next {timeframe} candle: {next_boundary.isoformat()} (+{safety_buffer_seconds}s buffer, {int(sleep_for)}s)")
-                        time.sleep(sleep_for)
-                        continue
-
-                    # otherwise normal first-run sleep
-                    next_boundary = next_candle_boundary(last_seen, interval_minutes)
-                    sleep_for = (next_boundary - datetime.now(timezone.utc)).total_seconds() + safety_buffer_seconds
-                    sleep_for = max(sleep_for, 5)
-                    logger.info(f"Sleeping until next {timeframe} candle: {next_boundary.isoformat()} (+{safety_buffer_seconds}s buffer, {int(sleep_for)}s)")
-                    time.sleep(sleep_for)
+                        last_seen = fetch_last_bar_time(symbol, timeframe) or last_seen
+                        now_ts = time.time()
+
+                    # wait for the candle after last_seen to close
+                    next_deadline = candle_deadline(last_seen, safety_buffer_seconds, min_wait=5, now_ts=now_ts)
+                    logger.info("Sleeping until next %s candle: %s (+%ss buffer, %ss)", timeframe, _iso(next_deadline - safety_buffer_seconds), safety_buffer_seconds, int(next_deadline - now_ts))
+                    backoff = _BACKOFF_MIN  # reset only once the whole iteration succeeded
                     continue
 
                 # New candle detected
                 if last_time > last_seen:
-                    logger.info(f"New {timeframe} candle detected: {last_time.isoformat()} (prev {last_seen.isoformat()})")
+                    logger.info("New %s candle detected: %s (prev %s)", timeframe, last_time.isoformat(), last_seen.isoformat())
 
                     ok, res = scan_ema.scan_once()
-                    logger.info(f"scan_once -> ok={ok} res={res}")
+                    logger.info("scan_once -> ok=%s res=%s", ok, res)
+                    last_seen = last_time
+                    now_ts = time.time()  # scan_once may block on a fill/monitor
 
                     # If scan said a position already exists, immediately monitor it (blocking)
                     if not ok and isinstance(res, str) and res == "position_already_open":
                         logger.info("scan_once reported position_already_open — entering monitor to show live PnL.")
-                        # log current positions summary then monitor (blocks)
-                        scan_ema.log_positions_summary(symbol)
+                        # scan_once already logged the positions summary -> go straight to monitor (blocks)
                         monitor_position_by_symbol(symbol, poll_interval=poll_interval_for_monitor)
                         logger.info("Monitor returned — position(s) closed. Refreshing last_seen and continuing loop.")
                         # after monitor returns, update last_seen to the latest candle to avoid re-processing the same candle
-                        df = fetch_bars(symbol, timeframe, count=2)
-                        last_seen = pd_time_to_datetime(df['time'].iloc[-1])
-                        # sleep until next candle boundary
-                        next_boundary = next_candle_boundary(last_seen, interval_minutes)
-                        sleep_for = (next_boundary - datetime.now(timezone.utc)).total_seconds() + safety_buffer_seconds
-                        sleep_for = max(sleep_for, 5)
-                        logger.info(f"Sleeping until next {timeframe} candle: {next_boundary.isoformat()} (+{safety_buffer_seconds}s buffer, {int(sleep_for)}s)")
-                        time.sleep(sleep_for)
-                        continue
-
-                    # normal flow after scan (whether it opened trade or not)
-                    # update last_seen and sleep until next candle
-                    last_seen = last_time
-                    next_boundary = next_candle_boundary(last_seen, interval_minutes)
-                    sleep_for = (next_boundary - datetime.now(timezone.utc)).total_seconds() + safety_buffer_seconds
-                    sleep_for = max(sleep_for, 5)
-                    logger.info(f"Sleeping until next {timeframe} candle: {next_boundary.isoformat()} (+{safety_buffer_seconds}s buffer, {int(sleep_for)}s)")
-                    time.sleep(sleep_for)
+                        last_seen = fetch_last_bar_time(symbol, timeframe) or last_seen
+                        now_ts = time.time()
+
+                    # normal flow after scan (whether it opened trade or not): wait for the next candle
+                    next_deadline = candle_deadline(last_seen, safety_buffer_seconds, min_wait=5, now_ts=now_ts)
+                    logger.info("Sleeping until next %s candle: %s (+%ss buffer, %ss)", timeframe, _iso(next_deadline - safety_buffer_seconds), safety_buffer_seconds, int(next_deadline - now_ts))
+                    backoff = _BACKOFF_MIN  # reset only once the whole iteration succeeded
                     continue
 
-                # No new candle yet -> sleep until expected boundary
-                next_boundary = next_candle_boundary(last_time, interval_minutes)
-                sleep_for = (next_boundary - datetime.now(timezone.utc)).total_seconds() + safety_buffer_seconds
-                sleep_for = max(sleep_for, 3)
-                logger.debug(f"No new {timeframe} yet. Sleeping {int(sleep_for)}s until {next_boundary.isoformat()}")
-                time.sleep(sleep_for)
+                # No new candle yet -> retry shortly after the expected boundary
+                next_deadline = candle_deadline(last_time, safety_buffer_seconds, min_wait=3, now_ts=now_ts)
+                logger.debug("No new %s yet. Sleeping %ss until %s", timeframe, int(next_deadline - now_ts), _iso(next_deadline))
+                backoff = _BACKOFF_MIN
                 continue
 
+            except MonitorCancelled:
+                raise
             except Exception as e:
-                logger.exception(f"Unexpected error in loop iteration: {e}")
-                time.sleep(30)
+                logger.exception("Unexpected error in loop iteration (retrying in ~%ss): %s", backoff, e)
+                next_deadline = time.time() + backoff + random.uniform(0, backoff / 4)
+                backoff = min(backoff * 2, _BACKOFF_MAX)
     except KeyboardInterrupt:
         logger.info("Run loop stopped by user (KeyboardInterrupt).")
+    except MonitorCancelled:
+        logger.info("Run loop stopped: monitor cancelled.")
     finally:
         shutdown_mt5()
         logger.info("Exited run loop, MT5 shutdown complete.")
+        scan_ema.stop_logging()
 
 
 if __name__ == "__main__":
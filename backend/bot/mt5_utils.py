@@ -1,7 +1,13 @@
 # mt5_utils.py
 import MetaTrader5 as mt5
+import os
+import re
+import time
 from datetime import datetime, timezone
 import logging
+from functools import lru_cache
+from pathlib import Path
+import numpy as np
 import pandas as pd
 from config_loader import config
 
@@ -16,48 +22,153 @@ TF_MAP = {
     "H2": mt5.TIMEFRAME_H2,
 }
 
+TF_SECONDS = {"M1": 60, "M5": 300, "M15": 900, "M30": 1800, "H1": 3600, "H2": 7200}
+
+# fetch_bars_cached() persists one bar window per (symbol, tf, count) for the current candle
+BAR_CACHE_DIR = Path.home() / ".swingpilot" / "cache"
+_bar_mem_cache = {}  # (symbol, tf, count) -> (candle_epoch, rates)
+
+@lru_cache(maxsize=16)
+def resolve_tf(timeframe_str: str) -> int:
+    """Map a config timeframe string ("M5", "H1", ...) to its mt5.TIMEFRAME_* constant."""
+    tf = TF_MAP.get(timeframe_str)
+    if tf is None:
+        raise ValueError(f"Unknown timeframe: {timeframe_str}")
+    return tf
+
 def initialize_mt5():
     if not mt5.initialize():
-        logger.error(f"mt5.initialize() failed: {mt5.last_error()}")
+        logger.error("mt5.initialize() failed: %s", mt5.last_error())
         raise RuntimeError("MT5 initialize failed")
     if config.MT5_LOGIN is not None:
         ok = mt5.login(config.MT5_LOGIN, password=config.MT5_PASSWORD, server=config.MT5_SERVER)
         if not ok:
-            logger.warning(f"MT5 login attempt returned: {mt5.last_error()}")
+            logger.warning("MT5 login attempt returned: %s", mt5.last_error())
     logger.info("MT5 initialized")
 
 def shutdown_mt5():
+    # a new terminal session re-checks Market Watch selection
+    _symbol_info_cache.clear()
     try:
         mt5.shutdown()
         logger.info("MT5 shutdown")
     except Exception:
         pass
 
+# symbol -> SymbolInfo for symbols already found + selected this MT5 session: repeat ensure_symbol calls skip the IPC
+_symbol_info_cache = {}
+
 def ensure_symbol(symbol: str):
+    if symbol in _symbol_info_cache:
+        return _symbol_info_cache[symbol]
     info = mt5.symbol_info(symbol)
     if info is None:
-        logger.error(f"Symbol {symbol} not found on server.")
+        logger.error("Symbol %s not found on server.", symbol)
         raise ValueError(f"Symbol {symbol} not found")
     if not info.visible:
         mt5.symbol_select(symbol, True)
-        logger.info(f"Selected {symbol} in Market Watch.")
+        logger.info("Selected %s in Market Watch.", symbol)
+    _symbol_info_cache[symbol] = info
     return info
 
-def fetch_bars(symbol: str, timeframe_str: str, count: int = None) -> pd.DataFrame:
+def fetch_rates(symbol: str, timeframe_str: str, count: int = None, pos_based: bool = None):
+    """
+    Return the raw MT5 structured array (fields time/open/high/low/close/...).
+    pos_based (default: True for count <= 4) indexes back from the newest bar with
+    copy_rates_from_pos instead of a timestamp search via copy_rates_from.
+    """
     if count is None:
         count = int(config.FETCH_BARS)
-    tf = TF_MAP.get(timeframe_str)
-    if tf is None:
-        raise ValueError(f"Unknown timeframe: {timeframe_str}")
-    utc_to = datetime.now(timezone.utc)
-    rates = mt5.copy_rates_from(symbol, tf, utc_to, int(count))
+    if pos_based is None:
+        pos_based = int(count) <= 4
+    tf = resolve_tf(timeframe_str)
+    if pos_based:
+        rates = mt5.copy_rates_from_pos(symbol, tf, 0, int(count))
+    else:
+        rates = mt5.copy_rates_from(symbol, tf, datetime.now(timezone.utc), int(count))
     if rates is None:
         err = mt5.last_error()
-        logger.error(f"Failed to fetch bars for {symbol} {timeframe_str}: {err}")
+        logger.error("Failed to fetch bars for %s %s: %s", symbol, timeframe_str, err)
         raise RuntimeError("Failed to fetch bars")
-    df = pd.DataFrame(rates)
-    df["time"] = pd.to_datetime(df["time"], unit="s")
+    return rates
+
+def last_bar_time(rates):
+    """UTC datetime of the newest bar in a raw rates array (None if empty)."""
+    if rates is None or len(rates) == 0:
+        return None
+    return datetime.fromtimestamp(int(rates["time"][-1]), tz=timezone.utc)
+
+def fetch_last_bar_time(symbol: str, timeframe_str: str):
+    """Newest bar open time as a UTC datetime, or None if MT5 returned nothing (polling path)."""
+    tf = resolve_tf(timeframe_str)
+    rates = mt5.copy_rates_from_pos(symbol, tf, 0, 2)
+    return last_bar_time(rates)
+
+def rates_to_df(rates) -> pd.DataFrame:
+    df = pd.DataFrame.from_records(rates)
+    # rates["time"] is already int64 unix seconds -> plain dtype cast, no to_datetime parsing
+    df["time"] = rates["time"].astype("datetime64[s]")
     return df
 
+def fetch_bars(symbol: str, timeframe_str: str, count: int = None) -> pd.DataFrame:
+    return rates_to_df(fetch_rates(symbol, timeframe_str, count))
+
+def _bar_cache_path(symbol, timeframe_str, count, candle_epoch):
+    safe_symbol = re.sub(r"[^A-Za-z0-9._-]", "_", symbol)
+    return BAR_CACHE_DIR / f"{safe_symbol}_{timeframe_str}_{count}_{candle_epoch}.npy"
+
+def _store_bar_cache(path, rates):
+    """Write rates atomically and drop older candles' files for the same window."""
+    try:
+        BAR_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_suffix(".tmp")
+        with open(tmp, "wb") as f:
+            np.save(f, rates)
+        os.replace(tmp, path)
+        prefix = path.name.rsplit("_", 1)[0] + "_"
+        for old in BAR_CACHE_DIR.glob(prefix + "*.npy"):
+            if old != path:
+                old.unlink(missing_ok=True)
+    except Exception as e:
+        logger.warning("Could not write bar cache %s: %s", path, e)
+
+def fetch_bars_cached(symbol: str, timeframe_str: str, count: int = None) -> pd.DataFrame:
+    """
+    fetch_bars() that reuses the bar window for the lifetime of the current candle,
+    from memory or (after a restart) from ~/.swingpilot/cache. On a hit only the newest,
+    still-forming bar is re-read from MT5, so its live OHLC stays current.
+    """
+    if count is None:
+        count = int(config.FETCH_BARS)
+    count = int(count)
+    tf = resolve_tf(timeframe_str)  # unknown timeframe -> ValueError, not a KeyError below
+    candle_epoch = int(time.time()) // TF_SECONDS[timeframe_str]
+    key = (symbol, timeframe_str, count)
+    path = _bar_cache_path(symbol, timeframe_str, count, candle_epoch)
+
+    rates = None
+    mem = _bar_mem_cache.get(key)
+    if mem is not None and mem[0] == candle_epoch:
+        rates = mem[1]
+    elif path.exists():
+        try:
+            rates = np.load(path, mmap_mode="r")
+        except Exception as e:
+            logger.warning("Ignoring unreadable bar cache %s: %s", path, e)
+
+    if rates is not None and len(rates) == count:
+        latest = mt5.copy_rates_from_pos(symbol, tf, 0, 1)
+        if latest is not None and len(latest) == 1 and latest["time"][0] == rates["time"][-1]:
+            rates = np.array(rates)  # own the memory (may be a read-only mmap)
+            rates[-1] = latest[0]
+            _bar_mem_cache[key] = (candle_epoch, rates)
+            return rates_to_df(rates)
+        # a new bar opened that the local clock has not bucketed yet -> full refetch
+
+    rates = fetch_rates(symbol, timeframe_str, count)
+    _bar_mem_cache[key] = (candle_epoch, rates)
+    _store_bar_cache(path, rates)
+    return rates_to_df(rates)
+
 def get_tick(symbol: str):
     return mt5.symbol_info_tick(symbol)
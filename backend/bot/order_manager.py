@@ -1,11 +1,45 @@
 # order_manager.py
 import math
+import time
 import logging
 import MetaTrader5 as mt5
 from config_loader import config
 
 logger = logging.getLogger("swingpilot.orders")
 
+# order constants
+_MIN_STOP = float(config.MIN_STOP_DISTANCE)
+_MAGIC = int(config.MAGIC)
+_MIN_LOT = float(config.MIN_LOT)
+# lots are counted in whole steps (e.g. 100 per lot for LOT_STEP=0.01)
+_LOT_STEP_INV = round(1.0 / float(config.LOT_STEP))
+
+
+def _order_template(action, order_type_mt5, filling):
+    # symbol/volume/price/sl/tp are placeholders filled per order (kept here to preserve key order)
+    return {
+        "action": action,
+        "symbol": None,
+        "volume": 0.0,
+        "type": order_type_mt5,
+        "price": 0.0,
+        "sl": 0.0,
+        "tp": 0.0,
+        "deviation": 20,
+        "magic": _MAGIC,
+        "comment": "SwingPilot",
+        "type_time": mt5.ORDER_TIME_GTC,
+        "type_filling": filling,
+    }
+
+# (order_type, direction) -> request template; build_order_request copies and fills these
+_ORDER_TEMPLATES = {
+    ("market", "long"): _order_template(mt5.TRADE_ACTION_DEAL, mt5.ORDER_TYPE_BUY, mt5.ORDER_FILLING_FOK),
+    ("market", "short"): _order_template(mt5.TRADE_ACTION_DEAL, mt5.ORDER_TYPE_SELL, mt5.ORDER_FILLING_FOK),
+    ("limit", "long"): _order_template(mt5.TRADE_ACTION_PENDING, mt5.ORDER_TYPE_BUY_LIMIT, mt5.ORDER_FILLING_RETURN),
+    ("limit", "short"): _order_template(mt5.TRADE_ACTION_PENDING, mt5.ORDER_TYPE_SELL_LIMIT, mt5.ORDER_FILLING_RETURN),
+}
+
 
 def cancel_pending_orders_for_symbol(symbol):
     """
@@ -16,30 +50,28 @@ def cancel_pending_orders_for_symbol(symbol):
     errors = []
 
     try:
-        orders = mt5.orders_get(symbol=symbol)
+        orders = mt5.orders_get(symbol=symbol) or ()
     except Exception as e:
-        logger.exception(f"orders_get() failed: {e}")
+        logger.exception("orders_get() failed: %s", e)
         return 0, [f"orders_get_failed:{e}"]
 
-    if not orders:
-        logger.info(f"No pending orders for {symbol}")
+    # Only cancel orders that belong to this EA (magic) to be safe
+    mine = [o for o in orders if getattr(o, "magic", 0) == _MAGIC]
+    if not mine:
+        logger.info("No pending orders for %s with magic %s (total pending: %s)", symbol, _MAGIC, len(orders))
         return 0, []
+    if len(mine) < len(orders):
+        logger.debug("Skipping %s pending order(s) not matching magic %s", len(orders) - len(mine), _MAGIC)
 
-    for o in orders:
+    for o in mine:
         try:
-            # Access fields safely (names vary by MT5 build)
-            ticket = getattr(o, "ticket", None) or getattr(o, "order", None) or (o[0] if len(o) > 0 else None)
-            magic = getattr(o, "magic", None) or getattr(o, "magic_number", None)
-
-            # Only cancel orders that belong to this EA (magic) to be safe
-            if magic is not None and int(magic) != int(config.MAGIC):
-                logger.debug(f"Skipping order {ticket} (magic={magic}) not matching {config.MAGIC}")
-                continue
+            # TradeOrder exposes .ticket on current builds; .order kept as the one fallback
+            ticket = getattr(o, "ticket", None) or getattr(o, "order", None)
 
-            logger.info(f"Cancelling pending order ticket={ticket} symbol={symbol} magic={magic}")
+            logger.info("Cancelling pending order ticket=%s symbol=%s magic=%s", ticket, symbol, _MAGIC)
 
             if bool(config.DRY_RUN):
-                logger.info(f"DRY_RUN: would cancel order {ticket}")
+                logger.info("DRY_RUN: would cancel order %s", ticket)
                 cancelled += 1
                 continue
 
@@ -48,7 +80,7 @@ def cancel_pending_orders_for_symbol(symbol):
                 "action": mt5.TRADE_ACTION_REMOVE,
                 "order": int(ticket),
                 "symbol": symbol,
-                "magic": int(config.MAGIC),
+                "magic": _MAGIC,
                 "comment": "SwingPilot-cancel-pending",
             }
             res = mt5.order_send(req)
@@ -56,47 +88,44 @@ def cancel_pending_orders_for_symbol(symbol):
                 # fallback: try order_delete
                 try:
                     rc = mt5.order_delete(int(ticket))
-                    logger.info(f"order_delete({ticket}) -> {rc}")
+                    logger.info("order_delete(%s) -> %s", ticket, rc)
                     cancelled += 1
                 except Exception as e2:
-                    logger.exception(f"order_delete failed for {ticket}: {e2}")
+                    logger.exception("order_delete failed for %s: %s", ticket, e2)
                     errors.append(f"{ticket}:delete_failed:{e2}")
             else:
                 ret = getattr(res, "retcode", None)
-                logger.info(f"order_send(REMOVE) -> retcode={ret} raw={res}")
+                logger.info("order_send(REMOVE) -> retcode=%s raw=%s", ret, res)
                 if ret == 0 or ret is None:
                     cancelled += 1
                 else:
                     errors.append(f"{ticket}:retcode={ret}")
         except Exception as e:
-            logger.exception(f"Exception while cancelling order {o}: {e}")
+            logger.exception("Exception while cancelling order %s: %s", o, e)
             errors.append(f"unknown:{e}")
 
-    logger.info(f"cancel_pending_orders_for_symbol: cancelled={cancelled} errors={errors}")
+    logger.info("cancel_pending_orders_for_symbol: cancelled=%s errors=%s", cancelled, errors)
     return cancelled, errors
 
 def round_lot(volume):
-    step = float(config.LOT_STEP)
-    min_l = float(config.MIN_LOT)
-    v = max(float(volume), min_l)
-    # floor to nearest step
-    v = math.floor(v / step) * step
-    return round(v, 8)
-
-def _validate_limit_price(symbol, direction, limit_price):
+    v = max(float(volume), _MIN_LOT)
+    # floor to a whole number of steps; the epsilon keeps 0.29*100 = 28.999... from flooring to 28.
+    # Dividing an integer step count gives the exact nearest float (0.29, not 0.29000000000000004).
+    return math.floor(v * _LOT_STEP_INV + 1e-9) / _LOT_STEP_INV
+
+def _validate_limit_price(tick, direction, limit_price, min_stop):
     """
-    Validate limit price for pending orders.
+    Validate limit price for pending orders against an already-fetched tick
+    (the same one build_order_request prices from, so ask/bid are consistent).
     Returns (ok: bool, reason: str).
-    buy limit must be < ask and distance >= MIN_STOP_DISTANCE
-    sell limit must be > bid and distance >= MIN_STOP_DISTANCE
+    buy limit must be < ask and distance >= min_stop
+    sell limit must be > bid and distance >= min_stop
     """
-    tick = mt5.symbol_info_tick(symbol)
     if tick is None:
         return False, "no tick available"
 
     ask = float(tick.ask)
     bid = float(tick.bid)
-    min_stop = float(config.MIN_STOP_DISTANCE)
 
     if direction == "long":
         if not (limit_price < ask - 1e-12):
@@ -126,69 +155,57 @@ def build_order_request(symbol, direction, volume, sl_price, tp_price, order_typ
     # normalize & round volume
     volume = float(volume)
     volume = round_lot(volume)
-    if volume < float(config.MIN_LOT):
-        logger.warning(f"Requested volume {volume} below MIN_LOT {config.MIN_LOT}")
+    if volume < _MIN_LOT:
+        logger.warning("Requested volume %s below MIN_LOT %s", volume, config.MIN_LOT)
+        return None
+
+    if order_type not in ("market", "limit"):
+        logger.error("Unknown order_type: %s", order_type)
         return None
 
     # Market order
     if order_type == "market":
-        if direction == "long":
-            price = float(tick.ask)
-            order_type_mt5 = mt5.ORDER_TYPE_BUY
-        else:
-            price = float(tick.bid)
-            order_type_mt5 = mt5.ORDER_TYPE_SELL
-
-        request = {
-            "action": mt5.TRADE_ACTION_DEAL,
-            "symbol": symbol,
-            "volume": float(volume),
-            "type": order_type_mt5,
-            "price": float(price),
-            "sl": float(sl_price),
-            "tp": float(tp_price),
-            "deviation": 20,
-            "magic": int(config.MAGIC),
-            "comment": "SwingPilot",
-            "type_time": mt5.ORDER_TIME_GTC,
-            "type_filling": mt5.ORDER_FILLING_FOK,
-        }
-        return request
+        price = float(tick.ask) if direction == "long" else float(tick.bid)
 
     # Pending limit order
-    if order_type == "limit":
+    else:
         if limit_price is None:
             logger.error("build_order_request: limit_price required for order_type='limit'")
             return None
 
-        ok, reason = _validate_limit_price(symbol, direction, float(limit_price))
+        ok, reason = _validate_limit_price(tick, direction, float(limit_price), _MIN_STOP)
         if not ok:
-            logger.warning(f"Limit price validation failed: {reason}")
+            logger.warning("Limit price validation failed: %s", reason)
             return None
+        price = float(limit_price)
+
+    request = _ORDER_TEMPLATES[(order_type, "long" if direction == "long" else "short")].copy()
+    request["symbol"] = symbol
+    request["volume"] = float(volume)
+    request["price"] = price
+    request["sl"] = float(sl_price)
+    request["tp"] = float(tp_price)
+    return request
+
+# (monotonic fetch time, TerminalInfo) — trade_allowed rarely changes between candles
+_ti_cache = (0.0, None)
+
+
+def _terminal_allows_trade(ttl=5.0):
+    """Cached mt5.terminal_info().trade_allowed; re-queried when older than ttl seconds."""
+    global _ti_cache
+    t, info = _ti_cache
+    now = time.monotonic()
+    if info is None or now - t > ttl:
+        info = mt5.terminal_info()
+        _ti_cache = (now, info)
+    return bool(info is not None and getattr(info, "trade_allowed", True))
+
+
+def _invalidate_terminal_info():
+    global _ti_cache
+    _ti_cache = (0.0, None)
 
-        if direction == "long":
-            order_type_mt5 = mt5.ORDER_TYPE_BUY_LIMIT
-        else:
-            order_type_mt5 = mt5.ORDER_TYPE_SELL_LIMIT
-
-        request = {
-            "action": mt5.TRADE_ACTION_PENDING,
-            "symbol": symbol,
-            "volume": float(volume),
-            "type": order_type_mt5,
-            "price": float(limit_price),
-            "sl": float(sl_price),
-            "tp": float(tp_price),
-            "deviation": 20,
-            "magic": int(config.MAGIC),
-            "comment": "SwingPilot",
-            "type_time": mt5.ORDER_TIME_GTC,
-            "type_filling": mt5.ORDER_FILLING_RETURN,
-        }
-        return request
-
-    logger.error(f"Unknown order_type: {order_type}")
-    return None
 
 def send_order(request):
     """
@@ -205,23 +222,28 @@ def send_order(request):
         return {"retcode": 0, "comment": "dry-run", "request": request}
 
     # quick guard: ensure terminal allows trading
-    ti = mt5.terminal_info()
-    if ti is None or not getattr(ti, "trade_allowed", True):
+    if not _terminal_allows_trade():
+        # don't trust the cached "disabled" state next time — the user may re-enable AutoTrading
+        _invalidate_terminal_info()
         logger.error("MT5 terminal reports trading not allowed (AutoTrading disabled). Not sending order.")
         return {"retcode": 10027, "comment": "AutoTrading disabled - prevented sending", "request": request}
 
     try:
         res = mt5.order_send(request)
     except Exception as e:
-        logger.exception(f"exception during mt5.order_send: {e}")
+        logger.exception("exception during mt5.order_send: %s", e)
+        _invalidate_terminal_info()
         return {"retcode": -2, "comment": f"exception:{e}", "request": request}
 
-    # log result
-    try:
-        rc = getattr(res, "retcode", None)
-        cm = getattr(res, "comment", None)
-        logger.info(f"Order send -> retcode={rc} comment={cm} raw={res}")
-    except Exception:
-        logger.info(f"Order send result (raw): {res}")
+    if res is None:
+        logger.error("order_send returned None: %s", mt5.last_error())
+        _invalidate_terminal_info()
+        return res
+
+    if res.retcode not in (mt5.TRADE_RETCODE_DONE, mt5.TRADE_RETCODE_PLACED):
+        # failed send -> re-check terminal state on the next attempt
+        _invalidate_terminal_info()
 
+    # OrderSendResult always carries retcode/comment
+    logger.info("Order send -> retcode=%s comment=%s raw=%s", res.retcode, res.comment, res)
     return res
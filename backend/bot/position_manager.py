@@ -1,21 +1,84 @@
 # position_manager.py
+import math
 import time
+import queue
 import logging
+import threading
 from datetime import datetime, timezone
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 import MetaTrader5 as mt5
 from config_loader import config
-# Optional: enable requests to push updates to backend (uncomment + configure)
-# import requests
+
+try:  # optional: only needed for live dashboard pushes (config.BACKEND_URL)
+    import requests
+except ImportError:
+    requests = None
 
 logger = logging.getLogger("swingpilot.position_manager")
 
-# Optional backend config (uncomment and set if you want live dashboard pushes)
-# BACKEND_URL = "http://localhost:8000"
-# API_KEY = "change_this_to_a_strong_key"
+# Dashboard pushes: the monitor only enqueues; one daemon thread batches queued events into
+# a single POST every _DASHBOARD_FLUSH_SEC over a keep-alive requests.Session. The body is
+# a JSON list of event objects, so a burst costs one request.
+_DASHBOARD_ENABLED = bool(config.BACKEND_URL) and requests is not None
+_DASHBOARD_QUEUE_MAX = 256
+_DASHBOARD_BATCH_MAX = 50
+_DASHBOARD_FLUSH_SEC = 1.0
+_dashboard_queue = queue.Queue(maxsize=_DASHBOARD_QUEUE_MAX)
+_dashboard_thread = None
+_dashboard_lock = threading.Lock()
+
+if config.BACKEND_URL and requests is None:
+    logger.warning("BACKEND_URL is set but 'requests' is not installed; dashboard pushes disabled.")
+
+
+def _dashboard_sender():
+    session = requests.Session()
+    if config.BACKEND_API_KEY:
+        session.headers["x-api-key"] = config.BACKEND_API_KEY
+    url = config.BACKEND_URL.rstrip("/") + "/api/events"
+    while True:
+        batch = [_dashboard_queue.get()]
+        while len(batch) < _DASHBOARD_BATCH_MAX:
+            try:
+                batch.append(_dashboard_queue.get_nowait())
+            except queue.Empty:
+                break
+        try:
+            session.post(url, json=batch, timeout=2)
+        except Exception as e:
+            logger.debug("Failed to push %s dashboard event(s) to backend: %s", len(batch), e)
+        # let events accumulate so a burst of snapshots goes out as one request
+        time.sleep(_DASHBOARD_FLUSH_SEC)
+
+
+def push_dashboard_event(event):
+    """Queue an event for the dashboard backend without blocking; drops the oldest when full."""
+    global _dashboard_thread
+    if not _DASHBOARD_ENABLED:
+        return
+    if _dashboard_thread is None:
+        with _dashboard_lock:
+            if _dashboard_thread is None:
+                _dashboard_thread = threading.Thread(target=_dashboard_sender, name="swingpilot-dashboard", daemon=True)
+                _dashboard_thread.start()
+    while True:
+        try:
+            _dashboard_queue.put_nowait(event)
+            return
+        except queue.Full:
+            try:
+                _dashboard_queue.get_nowait()
+            except queue.Empty:
+                pass
 
 def _now_iso():
     return datetime.now(timezone.utc).astimezone().isoformat(timespec="seconds")
 
+def _push_snapshot(symbol, positions, bid, ask, total_profit, total_volume):
+    """Queue a position_snapshot event for the dashboard (callers check _DASHBOARD_ENABLED)."""
+    push_dashboard_event({"type": "position_snapshot", "payload": {"symbol": symbol, "ts": _now_iso(), "total_unreal": total_profit, "total_vol": total_volume, "positions": [_format_pos_line(p, bid, ask) for p in positions]}})
+
 def _pos_side(p):
     # MetaTrader5 position type: 0 = buy, 1 = sell
     try:
@@ -23,20 +86,14 @@ def _pos_side(p):
     except Exception:
         return "UNKNOWN"
 
-def _current_price(symbol, side):
-    """Return a best current price (float) for symbol depending on side."""
-    tick = mt5.symbol_info_tick(symbol)
-    if tick is None:
-        return None
-    # for buys current price = ask (what you'd pay), for sells = bid (what you'd get)
-    return float(tick.ask if side == "BUY" else tick.bid)
-
-def _format_pos_line(p):
+def _format_pos_line(p, bid, ask):
+    """bid/ask come from one tick fetched by the caller (all positions share the symbol)."""
     ticket = getattr(p, "ticket", None)
     vol = float(getattr(p, "volume", 0.0))
     price_open = float(getattr(p, "price_open", 0.0))
     side = _pos_side(p)
-    cur_price = _current_price(getattr(p, "symbol", ""), side) or 0.0
+    # for buys current price = ask (what you'd pay), for sells = bid (what you'd get)
+    cur_price = (ask if side == "BUY" else bid) or 0.0
     unreal = float(getattr(p, "profit", 0.0))
     age = getattr(p, "time", None)  # sometimes position has time field; not guaranteed
     return {
@@ -51,222 +108,344 @@ def _format_pos_line(p):
 
 def _log_snapshot(symbol, positions):
     """Log a formatted snapshot of all positions for symbol."""
-    ts = _now_iso()
+    # no per-line timestamp: the handler formatter already stamps %(asctime)s
     total_profit = 0.0
     total_volume = 0.0
-    logger.info(f"[{ts}] Position snapshot for {symbol} (count={len(positions)})")
+    logger.info("Position snapshot for %s (count=%s)", symbol, len(positions))
+    tick = mt5.symbol_info_tick(symbol)
+    bid, ask = (float(tick.bid), float(tick.ask)) if tick is not None else (None, None)
     for p in positions:
-        info = _format_pos_line(p)
+        info = _format_pos_line(p, bid, ask)
         total_profit += info["unreal"]
         total_volume += info["volume"]
-        logger.info(f"[{ts}]  ticket={info['ticket']} side={info['side']} vol={info['volume']:.4f} open={info['open']} cur={info['current']} unreal={info['unreal']:.2f}")
-    logger.info(f"[{ts}]  TOTAL vol={total_volume:.4f} total_unreal={total_profit:.2f}")
+        logger.info(" ticket=%s side=%s vol=%.4f open=%s cur=%s unreal=%.2f", info['ticket'], info['side'], info['volume'], info['open'], info['current'], info['unreal'])
+    logger.info(" TOTAL vol=%.4f total_unreal=%.2f", total_volume, total_profit)
+
+    # push to backend for dashboard (no-op unless config.BACKEND_URL is set)
+    if _DASHBOARD_ENABLED:
+        _push_snapshot(symbol, positions, bid, ask, total_profit, total_volume)
 
-    # Optional: push to backend for dashboard (uncomment to enable)
-    # try:
-    #     payload = {"type":"position_snapshot", "payload":{"symbol":symbol, "ts":ts, "total_unreal": total_profit, "total_vol": total_volume, "positions":[_format_pos_line(p) for p in positions]}}
-    #     headers = {"x-api-key": API_KEY}
-    #     requests.post(BACKEND_URL + "/api/events", json=payload, headers=headers, timeout=2)
-    # except Exception as e:
-    #     logger.debug(f"Failed to push position snapshot to backend: {e}")
+# monitor constants
+_DRY_RUN = bool(config.DRY_RUN)
+_MAGIC = int(config.MAGIC)
 
+# adaptive monitor poll bounds (seconds)
+_POLL_MIN = 0.5
+_POLL_MAX = 30.0
+
+# symbol -> (digits, point) from symbol_info, filled once per symbol by _symbol_precision()
+_symbol_meta = {}
+
+# tickets already tightened (one tighten per ticket per session; the new SL is logged on success)
 _tightened_positions = set()
 
-def _safe_getattr(obj, name, default=None):
-    try:
-        return getattr(obj, name, default)
-    except Exception:
-        try:
-            return obj.get(name, default)
-        except Exception:
-            return default
+# The official MetaTrader5 package has no order_modify(); probe once instead of failing per tighten.
+# Set to False after the first failed call so we never re-probe.
+_HAS_ORDER_MODIFY = callable(getattr(mt5, "order_modify", None))
+
+# hot-path MT5 calls bound once (skips the module attribute lookup on every poll)
+_positions_get = mt5.positions_get
+_symbol_info_tick = mt5.symbol_info_tick
+_order_send = mt5.order_send
+_TRADE_ACTION_SLTP = mt5.TRADE_ACTION_SLTP
+
+# retcodes that mean the SL/TP change was applied (0/None kept for older builds / wrappers)
+_SLTP_OK_RETCODES = (mt5.TRADE_RETCODE_DONE, 0, None)
+
 
 def _modify_position_sl(ticket, new_sl, symbol, current_tp=None):
     """
-    Try to modify SL of the given position ticket.
-    Uses mt5.order_modify() if available; falls back to mt5.order_send() with TRADE_ACTION_SLTP.
+    Try to modify SL of the given position ticket via order_send(TRADE_ACTION_SLTP).
+    mt5.order_modify() is only tried when the installed build actually provides it.
     Returns (ok: bool, info: object/res or error)
     """
-    if bool(config.DRY_RUN):
-        logger.info(f"DRY_RUN: would modify SL for ticket={ticket} to {new_sl} (symbol={symbol})")
+    global _HAS_ORDER_MODIFY
+    if _DRY_RUN:
+        logger.info("DRY_RUN: would modify SL for ticket=%s to %s (symbol=%s)", ticket, new_sl, symbol)
         return True, {"dry_run": True}
 
-    # Try mt5.order_modify (signature differs between builds; we attempt safe calls)
-    try:
-        # Many examples use: mt5.order_modify(ticket, price, sl, tp, deviation)
-        # We'll attempt a few variants defensively.
+    tp = float(current_tp) if current_tp else 0.0
+
+    if _HAS_ORDER_MODIFY:
         try:
-            # most common:
-            res = mt5.order_modify(int(ticket), 0.0, float(new_sl), float(current_tp) if current_tp else 0.0, 0)
+            res = mt5.order_modify(int(ticket), 0.0, float(new_sl), tp, 0)
             rc = getattr(res, "retcode", None)
-            logger.info(f"order_modify(ticket={ticket}) -> retcode={rc} raw={res}")
-            if rc == 0 or rc is None:
+            logger.info("order_modify(ticket=%s) -> retcode=%s raw=%s", ticket, rc, res)
+            if rc in _SLTP_OK_RETCODES:
                 return True, res
         except Exception as e1:
-            logger.debug(f"order_modify variant 1 failed: {e1}")
+            logger.debug("order_modify unusable on this build, using TRADE_ACTION_SLTP from now on: %s", e1)
+            _HAS_ORDER_MODIFY = False
 
-        # Fallback: try sending a SL/TP update request using TRADE_ACTION_SLTP if available
-        try:
-            req = {
-                "action": mt5.TRADE_ACTION_SLTP,
-                "position": int(ticket),
-                "sl": float(new_sl),
-                "tp": float(current_tp) if current_tp else 0.0,
-                "magic": int(config.MAGIC),
-                "comment": "SwingPilot-SL-tighten"
-            }
-            res2 = mt5.order_send(req)
-            rc2 = getattr(res2, "retcode", None)
-            logger.info(f"order_send(TRAIL SL) ticket={ticket} -> retcode={rc2} raw={res2}")
-            if rc2 == 0 or rc2 is None:
-                return True, res2
-            return False, res2
-        except Exception as e2:
-            logger.exception(f"order_send(TRAIL SL) failed for ticket={ticket}: {e2}")
-            return False, e2
+    try:
+        req = {
+            "action": _TRADE_ACTION_SLTP,
+            "symbol": symbol,
+            "position": int(ticket),
+            "sl": float(new_sl),
+            "tp": tp,
+            "magic": _MAGIC,
+            "comment": "SwingPilot-SL-tighten"
+        }
+        res2 = _order_send(req)
+        rc2 = getattr(res2, "retcode", None)
+        logger.info("order_send(TRAIL SL) ticket=%s -> retcode=%s raw=%s", ticket, rc2, res2)
+        if res2 is not None and rc2 in _SLTP_OK_RETCODES:
+            return True, res2
+        return False, res2
+    except Exception as e2:
+        logger.exception("order_send(TRAIL SL) failed for ticket=%s: %s", ticket, e2)
+        return False, e2
+
+
+# Blocking waits (position monitor, pending-fill wait) run on one worker thread so the
+# main thread stays free for signals; the stop event interrupts whichever loop is running.
+_stop_event = threading.Event()
+_worker = ThreadPoolExecutor(max_workers=1, thread_name_prefix="swingpilot-monitor")
+
+
+class MonitorCancelled(Exception):
+    """Raised out of the monitor / pending-fill wait after cancel_monitor(); the run should stop."""
+
+
+def cancel_monitor():
+    """Ask the running monitor / pending-fill wait to stop at its next wake-up (safe from signal handlers)."""
+    _stop_event.set()
+
+
+def clear_cancel():
+    """Forget an earlier cancel_monitor(); call once at the start of a run, not per wait."""
+    _stop_event.clear()
 
-    except Exception as e:
-        logger.exception(f"Unexpected exception modifying SL for ticket={ticket}: {e}")
-        return False, e
 
-    # If reached, treat as failure
-    logger.warning(f"Could not modify SL for ticket={ticket} (no working API path).")
-    return False, None
+def stop_requested(timeout):
+    """Sleep up to `timeout` seconds; returns True early if cancel_monitor() was called."""
+    return _stop_event.wait(timeout)
+
+
+def run_on_worker(fn, *args, **kwargs):
+    """
+    Run a blocking loop on the monitor worker and wait for its result.
+    Raises MonitorCancelled without starting if cancel_monitor() already fired this run
+    (e.g. between the pending-fill wait and the monitor).
+    Anything that unwinds the caller (Ctrl+C, sys.exit() from a signal handler, ...) cancels
+    the loop, waits for it to unwind, then re-raises.
+    """
+    if _stop_event.is_set():
+        raise MonitorCancelled()
+    fut = _worker.submit(fn, *args, **kwargs)
+    try:
+        while True:
+            try:
+                # timed wait keeps the main thread responsive to KeyboardInterrupt on Windows
+                return fut.result(timeout=1.0)
+            except FutureTimeout:
+                continue
+    except BaseException:
+        # the worker thread is non-daemon: left running, it would block interpreter shutdown
+        _stop_event.set()
+        try:
+            fut.result()
+        except Exception:
+            pass  # keep the caller's exception
+        raise
+
+
+def _symbol_precision(symbol):
+    """(digits, point) for symbol; falls back to 5 digits if symbol_info is unavailable (not cached)."""
+    meta = _symbol_meta.get(symbol)
+    if meta is None:
+        info = mt5.symbol_info(symbol)
+        if info is None:
+            logger.warning("symbol_info(%s) unavailable; rounding SL to 5 digits.", symbol)
+            return 5, 1e-5
+        meta = _symbol_meta[symbol] = (int(info.digits), float(info.point))
+    return meta
+
+
+def _pos_ticket(p):
+    # TradePosition exposes .ticket; .order kept as the fallback (0 when neither is set)
+    return getattr(p, "ticket", 0) or getattr(p, "order", 0) or 0
+
+
+def _pos_array(positions, field, n):
+    return np.fromiter((float(getattr(p, field, 0) or 0.0) for p in positions), dtype=np.float64, count=n)
+
+
+def _try_tighten(symbol, ticket, pos_type, entry_price, sl_price, tp_price, current_price, reduced_risk, digits):
+    """One-time SL tighten for a position that reached TRAIL_TRIGGER_RR (SL set REDUCED_RISK_USD from entry)."""
+    # desired SL measured from ENTRY (user requested)
+    if pos_type == 0:  # BUY
+        desired_new_sl = entry_price - reduced_risk
+    else:  # SELL
+        desired_new_sl = entry_price + reduced_risk
+
+    # Round to the symbol's quote precision (2 for XAU/indices, 3 for JPY pairs, 5 for majors)
+    desired_new_sl = round(desired_new_sl, digits)
+
+    # Safety checks:
+    # - Must actually reduce risk (move SL *towards* entry)
+    # - Must not be placed on the wrong side of the market (would close immediately)
+    current_sl_val = sl_price if sl_price else None
+
+    # Determine whether desired_new_sl is an improvement (closer to entry)
+    if current_sl_val is None:
+        # no SL present — only allow if desired_new_sl is sensible relative to current price
+        should_attempt = True
+    elif pos_type == 0:  # BUY: closer to entry means desired_new_sl > current_sl_val
+        should_attempt = desired_new_sl > current_sl_val
+    else:  # SELL: closer to entry means desired_new_sl < current_sl_val
+        should_attempt = desired_new_sl < current_sl_val
+
+    # Ensure desired_new_sl does not cross/lie on the wrong side of current market
+    # For BUY: desired_new_sl must be strictly < current_price (not >=)
+    # For SELL: desired_new_sl must be strictly > current_price
+    if should_attempt:
+        if pos_type == 0 and not (desired_new_sl < current_price):
+            logger.warning("Desired SL %s would be >= current_price %s; skipping to avoid immediate close.", desired_new_sl, current_price)
+            should_attempt = False
+        if pos_type == 1 and not (desired_new_sl > current_price):
+            logger.warning("Desired SL %s would be <= current_price %s; skipping to avoid immediate close.", desired_new_sl, current_price)
+            should_attempt = False
+
+    if not should_attempt:
+        logger.debug("Skipping SL tighten for ticket=%s. desired_new_sl=%s, current_sl=%s, current_price=%s", ticket, desired_new_sl, current_sl_val, current_price)
+        return
+
+    logger.info("Attempting SL tighten for ticket=%s: desired_new_sl (from ENTRY) -> %s (reduced risk $%s)", ticket, desired_new_sl, reduced_risk)
+    ok, info = _modify_position_sl(ticket, desired_new_sl, symbol, current_tp=tp_price)
+    if ok:
+        logger.info("Successfully tightened SL for ticket=%s -> %s", ticket, desired_new_sl)
+        _tightened_positions.add(ticket)
+    else:
+        logger.warning("Failed to tighten SL for ticket=%s. info=%s", ticket, info)
 
 
 def monitor_position_by_symbol(symbol, poll_interval=5):
     """
     Monitor open positions for `symbol`. Logs profit periodically until the position closes.
     Additionally, applies a one-time SL tightening when the trade reaches TRAIL_TRIGGER_RR.
-    This is blocking and intended to be run in the main thread (or a dedicated thread).
+    Blocks the caller; the loop itself runs on the monitor worker. Returns once the
+    positions are gone; raises MonitorCancelled when cancel_monitor() is called.
+
+    Wake-ups are event driven: the loop idles on a cheap tick read (<= 1s) and only runs
+    the full position/SL pass when a new M1 bar starts, when tick time has advanced by
+    the adaptive poll interval, or every `heartbeat` seconds so closes are noticed in a
+    quiet market. The adaptive interval is `poll_interval` scaled by how far the nearest
+    untightened position is from TRAIL_TRIGGER_RR, clamped to [0.5, 30] seconds.
     """
-    logger.info(f"Starting monitor for {symbol} (poll_interval={poll_interval}s)")
+    return run_on_worker(_monitor_loop, symbol, poll_interval)
+
+
+def _monitor_loop(symbol, poll_interval):
+    logger.info("Starting monitor for %s (poll_interval=%ss)", symbol, poll_interval)
+    # loop invariants
+    trigger_rr = float(config.TRAIL_TRIGGER_RR)
+    reduced_risk = float(config.REDUCED_RISK_USD)
+    default_sl_dist = abs(float(config.SL_DISTANCE_USD))
+    idle_sleep = min(1.0, float(poll_interval))
+    heartbeat = max(float(poll_interval), 60.0)
+    last_eval_msc = None  # tick time (ms) of the last full pass
+    last_eval_wall = 0.0
+    next_poll = float(poll_interval)  # adaptive: shrinks as a position nears the trigger
+    digits = _symbol_precision(symbol)[0]
+    # function locals: LOAD_FAST in the poll loop
+    symbol_info_tick = _symbol_info_tick
+    positions_get = _positions_get
     try:
         while True:
-            positions = mt5.positions_get(symbol=symbol)
+            # one tick per poll: every position here is on `symbol`
+            tick = symbol_info_tick(symbol)
+            tick_msc = int(getattr(tick, "time_msc", 0)) if tick is not None else None
+            if last_eval_msc is not None and time.monotonic() - last_eval_wall < heartbeat:
+                # new M1 bar == tick crossed a minute boundary (no extra copy_rates call needed)
+                new_bar = tick_msc is not None and tick_msc // 60000 != last_eval_msc // 60000
+                moved = tick_msc is not None and tick_msc - last_eval_msc >= next_poll * 1000
+                if not (new_bar or moved):
+                    if stop_requested(min(idle_sleep, next_poll)):
+                        logger.info("Monitor for %s cancelled.", symbol)
+                        raise MonitorCancelled(symbol)
+                    continue
+            last_eval_msc = tick_msc if tick_msc is not None else (last_eval_msc or 0)
+            last_eval_wall = time.monotonic()
+
+            positions = positions_get(symbol=symbol)
             if not positions or len(positions) == 0:
-                logger.info(f"No open positions for {symbol}. Monitor exiting.")
+                logger.info("No open positions for %s. Monitor exiting.", symbol)
                 break
 
-            # If multiple positions exist, iterate each and sum profits
-            total_profit = 0.0
-            total_volume = 0.0
-            for p in positions:
-                # defensive attribute extraction
-                ticket = _safe_getattr(p, "ticket", None) or _safe_getattr(p, "order", None)
-                vol = float(_safe_getattr(p, "volume", 0.0))
-                prof = float(_safe_getattr(p, "profit", 0.0))
-                price_open = float(_safe_getattr(p, "price_open", _safe_getattr(p, "price", 0.0)))
-                pos_type = int(_safe_getattr(p, "type", 0))   # 0=BUY,1=SELL
-                sl_price = _safe_getattr(p, "sl", None)
-                tp_price = _safe_getattr(p, "tp", None)
-
-                # live market price for calculation
-                tick = mt5.symbol_info_tick(symbol)
-                if tick is None:
-                    logger.debug("No tick info available while monitoring; skipping price-based checks this round.")
-                    current_price = price_open
+            if tick is None:
+                logger.debug("No tick info available while monitoring; skipping price-based checks this round.")
+                bid = ask = None
+            else:
+                bid = float(tick.bid)
+                ask = float(tick.ask)
+
+            # summary totals every pass: one C-level generator sum per field, no per-position control flow
+            total_profit = math.fsum(p.profit for p in positions)
+            total_volume = math.fsum(p.volume for p in positions)
+
+            # already tightened -> nothing left to decide for this ticket; only the totals matter
+            untightened = [p for p in positions if _pos_ticket(p) not in _tightened_positions]
+            next_poll = float(poll_interval)
+            if untightened:
+                # working set as parallel arrays (untightened positions x one tick)
+                n = len(untightened)
+                # TradePosition is a namedtuple: plain getattr never raises for these fields
+                tickets = np.fromiter((_pos_ticket(p) for p in untightened), dtype=np.int64, count=n)
+                vols = _pos_array(untightened, "volume", n)
+                profits = _pos_array(untightened, "profit", n)
+                opens = _pos_array(untightened, "price_open", n)
+                types = np.fromiter((int(getattr(p, "type", 0) or 0) for p in untightened), dtype=np.int8, count=n)  # 0=BUY,1=SELL
+                sls = _pos_array(untightened, "sl", n)
+                tps = _pos_array(untightened, "tp", n)
+
+                # live price: bid for longs, ask for shorts; no tick -> entry price (rr 0, nothing triggers)
+                if bid is None:
+                    cur_prices = opens
                 else:
-                    # For longs, use bid; for shorts use ask as current effective price
-                    current_price = float(tick.bid) if pos_type == 0 else float(tick.ask)
-
-                side = "BUY" if pos_type == 0 else "SELL"
-                logger.info(f" - ticket={ticket} side={side} vol={vol:.4f} open={price_open} profit={prof:.2f}")
-
-                total_profit += prof
-                total_volume += vol
-
-                # --- SL tightening logic ---
-                try:
-                    # Only consider tightening for our EA-managed positions (we assumed single symbol per EA).
-                    # Make sure we haven't tightened this ticket already in this session.
+                    cur_prices = np.where(types == 0, bid, ask)
+                price_moves = np.where(types == 0, cur_prices - opens, opens - cur_prices)
+                # SL missing on the position -> configured SL distance relative to entry
+                init_sl = np.abs(opens - sls)
+                init_sl = np.where((sls > 0) & (init_sl > 0), init_sl, default_sl_dist)
+                with np.errstate(divide="ignore", invalid="ignore"):
+                    rr = np.where(init_sl > 0, price_moves / init_sl, 0.0)
+
+                watch = (tickets != 0) & (init_sl > 0)
+                tighten_mask = watch & (rr >= trigger_rr)
+
+                # poll faster the closer an untightened position is to the trigger, slower when far away
+                if watch.any():
+                    gaps = np.maximum(0.1, trigger_rr - rr[watch])
+                    next_poll = float(np.clip(poll_interval * gaps, _POLL_MIN, _POLL_MAX).min())
+
+                for i in range(n):
+                    ticket = int(tickets[i]) or None
+                    logger.info(" - ticket=%s side=%s vol=%.4f open=%s profit=%.2f", ticket, "BUY" if types[i] == 0 else "SELL", vols[i], opens[i], profits[i])
                     if ticket is None:
                         logger.debug("Position missing ticket id; skipping tighten check.")
-                    elif ticket in _tightened_positions:
-                        logger.debug(f"Ticket {ticket} already tightened earlier; skipping.")
                     else:
-                        # compute initial SL distance in price units
-                        if sl_price is None or sl_price == 0:
-                            # if SL missing in position object, fall back to configured SL distance relative to entry
-                            initial_sl_distance = abs(float(config.SL_DISTANCE_USD))
-                        else:
-                            initial_sl_distance = abs(price_open - float(sl_price))
-                            if initial_sl_distance <= 0:
-                                initial_sl_distance = abs(float(config.SL_DISTANCE_USD))
-
-                        if initial_sl_distance <= 0:
-                            logger.debug("initial_sl_distance evaluated to zero — skipping tighten check.")
-                        else:
-                            # compute current RR (price-distance based)
-                            if pos_type == 0:  # BUY
-                                price_move = current_price - price_open
-                            else:  # SELL
-                                price_move = price_open - current_price
-
-                            current_rr = price_move / initial_sl_distance
-                            logger.debug(f"Ticket {ticket} current_rr={current_rr:.3f} (price_move={price_move:.6f} init_sl={initial_sl_distance:.6f})")
-
-                            # check trigger >= configured RR
-                            trigger_rr = float(getattr(config, "TRAIL_TRIGGER_RR", 2.0))
-                            if current_rr >= trigger_rr:
-                                # compute new SL price so remaining price-distance (from current price) equals REDUCED_RISK_USD
-                                reduced_risk = float(getattr(config, "REDUCED_RISK_USD", 3.0))
-                                entry_price = float(price_open)
-
-                                # desired SL measured from ENTRY (user requested)
-                                if pos_type == 0:  # BUY
-                                    desired_new_sl = entry_price - reduced_risk
-                                else:  # SELL
-                                    desired_new_sl = entry_price + reduced_risk
-
-                                # Round for broker precision safety
-                                desired_new_sl = round(desired_new_sl, 5)
-
-                                # Safety checks:
-                                # - Must actually reduce risk (move SL *towards* entry)
-                                # - Must not be placed on the wrong side of the market (would close immediately)
-                                current_sl_val = float(sl_price) if (sl_price is not None and sl_price != 0) else None
-
-                                # Determine whether desired_new_sl is an improvement (closer to entry)
-                                should_attempt = False
-                                if current_sl_val is None:
-                                    # no SL present — only allow if desired_new_sl is sensible relative to current price
-                                    should_attempt = True
-                                else:
-                                    if pos_type == 0:  # BUY: closer to entry means desired_new_sl > current_sl_val
-                                        if desired_new_sl > current_sl_val:
-                                            should_attempt = True
-                                    else:  # SELL: closer to entry means desired_new_sl < current_sl_val
-                                        if desired_new_sl < current_sl_val:
-                                            should_attempt = True
-
-                                # Ensure desired_new_sl does not cross/lie on the wrong side of current market
-                                # For BUY: desired_new_sl must be strictly < current_price (not >=)
-                                # For SELL: desired_new_sl must be strictly > current_price
-                                if should_attempt:
-                                    if pos_type == 0 and not (desired_new_sl < current_price):
-                                        logger.warning(f"Desired SL {desired_new_sl} would be >= current_price {current_price}; skipping to avoid immediate close.")
-                                        should_attempt = False
-                                    if pos_type == 1 and not (desired_new_sl > current_price):
-                                        logger.warning(f"Desired SL {desired_new_sl} would be <= current_price {current_price}; skipping to avoid immediate close.")
-                                        should_attempt = False
-
-                                if should_attempt:
-                                    logger.info(f"Attempting SL tighten for ticket={ticket}: desired_new_sl (from ENTRY) -> {desired_new_sl} (reduced risk ${reduced_risk})")
-                                    ok, info = _modify_position_sl(ticket, desired_new_sl, symbol, current_tp=tp_price)
-                                    if ok:
-                                        logger.info(f"Successfully tightened SL for ticket={ticket} -> {desired_new_sl}")
-                                        _tightened_positions.add(ticket)
-                                    else:
-                                        logger.warning(f"Failed to tighten SL for ticket={ticket}. info={info}")
-                                else:
-                                    logger.debug(f"Skipping SL tighten for ticket={ticket}. desired_new_sl={desired_new_sl}, current_sl={current_sl_val}, current_price={current_price}")
-                except Exception as e:
-                    logger.exception(f"Error during SL tighten check for ticket={ticket}: {e}")
-
-            logger.info(f"Position monitor summary for {symbol}: total_volume={total_volume:.4f} total_unrealized_profit={total_profit:.2f}")
-
-            # sleep then continue
-            time.sleep(poll_interval)
+                        logger.debug("Ticket %s current_rr=%.3f (price_move=%.6f init_sl=%.6f)", ticket, rr[i], price_moves[i], init_sl[i])
+
+                # only the few positions past the trigger go through the per-ticket safety checks
+                for i in np.flatnonzero(tighten_mask):
+                    ticket = int(tickets[i])
+                    try:
+                        _try_tighten(symbol, ticket, int(types[i]), float(opens[i]), float(sls[i]), float(tps[i]), float(cur_prices[i]), reduced_risk, digits)
+                    except Exception as e:
+                        logger.exception("Error during SL tighten check for ticket=%s: %s", ticket, e)
+
+            logger.info("Position monitor summary for %s: total_volume=%.4f total_unrealized_profit=%.2f", symbol, total_volume, total_profit)
+            # one dashboard snapshot per full pass (config.BACKEND_URL set)
+            if _DASHBOARD_ENABLED:
+                _push_snapshot(symbol, positions, bid, ask, total_profit, total_volume)
+
+            # short idle; the event check at the top decides when the next full pass runs
+            if stop_requested(min(idle_sleep, next_poll)):
+                logger.info("Monitor for %s cancelled.", symbol)
+                raise MonitorCancelled(symbol)
+    except MonitorCancelled:
+        raise
     except Exception as e:
-        logger.exception(f"Exception in monitor_position_by_symbol: {e}")
\ No newline at end of file
+        logger.exception("Exception in monitor_position_by_symbol: %s", e)
\ No newline at end of file
@@ -1,25 +1,38 @@
 # scan_ema.py
 import logging
+import queue
+from logging.handlers import QueueHandler, QueueListener
 from config_loader import config
-from mt5_utils import initialize_mt5, shutdown_mt5, ensure_symbol, fetch_bars, get_tick
-from strategy import analyze_trend, detect_entry_15m
+from mt5_utils import initialize_mt5, shutdown_mt5, ensure_symbol, fetch_bars, fetch_bars_cached, get_tick
+from strategy import analyze_trend, detect_entry_15m, candles_from_df
 from order_manager import build_order_request, send_order, round_lot,cancel_pending_orders_for_symbol
 import time
 import MetaTrader5 as mt5
-from position_manager import monitor_position_by_symbol
+from position_manager import monitor_position_by_symbol, run_on_worker, stop_requested, clear_cancel, MonitorCancelled
 logger = logging.getLogger("swingpilot")
-def get_open_positions(symbol):
+
+# polled MT5 calls bound once
+_positions_get = mt5.positions_get
+_orders_get = mt5.orders_get
+
+def iter_open_positions(symbol):
+    """Open positions for symbol as the raw MT5 tuple (empty tuple on none/error; no list copy)."""
     try:
-        pos = mt5.positions_get(symbol=symbol)
-        return list(pos) if pos else []
+        return _positions_get(symbol=symbol) or ()
     except Exception as e:
-        logger.exception(f"Error fetching positions for {symbol}: {e}")
-        return []
+        logger.exception("Error fetching positions for %s: %s", symbol, e)
+        return ()
 
-def log_positions_summary(symbol):
-    positions = get_open_positions(symbol)
+def has_open_positions(symbol):
+    """True if any position is open for symbol (for checks that don't need the positions)."""
+    return bool(iter_open_positions(symbol))
+
+def log_positions_summary(symbol, positions=None):
+    """Log each open position and totals. Pass `positions` when the caller already fetched them."""
+    if positions is None:
+        positions = iter_open_positions(symbol)
     if not positions:
-        logger.info(f"No open positions for {symbol}")
+        logger.info("No open positions for %s", symbol)
         return 0.0, 0.0
 
     total_profit = 0.0
@@ -31,51 +44,115 @@ def log_positions_summary(symbol):
         price_open = getattr(p, "price_open", None)
         pos_type = getattr(p, "type", None)
         side = "BUY" if pos_type == 0 else "SELL"
-        logger.info(f" - ticket={ticket} side={side} vol={vol:.4f} open={price_open} profit={prof:.2f}")
+        logger.info(" - ticket=%s side=%s vol=%.4f open=%s profit=%.2f", ticket, side, vol, price_open, prof)
         total_profit += prof
         total_volume += vol
 
-    logger.info(f"Open positions for {symbol}: total_volume={total_volume:.4f} total_unrealized_profit={total_profit:.2f}")
+    logger.info("Open positions for %s: total_volume=%.4f total_unrealized_profit=%.2f", symbol, total_volume, total_profit)
     return total_volume, total_profit
 
 
 
+# background thread that does the actual file/console writes (see setup_logging)
+_log_listener = None
+
 def setup_logging():
+    global _log_listener
     logger.setLevel(logging.DEBUG if config.VERBOSE else logging.INFO)
-    fh = logging.FileHandler(config.LOG_FILE)
-    fh.setLevel(logging.DEBUG)
-    ch = logging.StreamHandler()
-    ch.setLevel(logging.DEBUG if config.VERBOSE else logging.INFO)
-    fmt = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
-    fh.setFormatter(fmt)
-    ch.setFormatter(fmt)
     if not logger.handlers:
-        logger.addHandler(fh)
-        logger.addHandler(ch)
+        fh = logging.FileHandler(config.LOG_FILE)
+        fh.setLevel(logging.DEBUG)
+        ch = logging.StreamHandler()
+        ch.setLevel(logging.DEBUG if config.VERBOSE else logging.INFO)
+        fmt = logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+        fh.setFormatter(fmt)
+        ch.setFormatter(fmt)
+        # trading loops only enqueue records; disk/console I/O happens on the listener thread
+        q = queue.Queue(-1)
+        logger.addHandler(QueueHandler(q))
+        _log_listener = QueueListener(q, fh, ch, respect_handler_level=True)
+        _log_listener.start()
     # also set children loggers to propagate
     logging.getLogger("swingpilot.mt5").propagate = True
     logging.getLogger("swingpilot.strategy").propagate = True
     logging.getLogger("swingpilot.orders").propagate = True
 
-def scan_once(poll_interval_seconds=40):
+def stop_logging():
+    """Flush queued log records and stop the listener thread (call on shutdown)."""
+    global _log_listener
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
+
+def wait_for_pending_fill(symbol, max_wait, poll_int):
+    """Poll until a position appears for `symbol` (pending order filled). Returns True if filled, False on timeout; raises MonitorCancelled on cancel."""
+    # a vanished pending order without a fill is rare -> only re-check orders every ~30s
+    orders_check_every = max(1, 30 // max(poll_int, 1))
+    polls = 0
+    waited = 0
+    while waited < max_wait:
+        # check if pending converted to a position (filled)
+        if has_open_positions(symbol):
+            logger.info("Pending order filled -> open position(s) found for %s.", symbol)
+            return True
+
+        # check if pending order still exists
+        if polls % orders_check_every == 0:
+            try:
+                orders = _orders_get(symbol=symbol)
+            except Exception as e:
+                orders = None
+                logger.exception("orders_get() failed while monitoring pending: %s", e)
+
+            if orders is None or len(orders) == 0:
+                logger.debug("No pending orders currently present for this symbol.")
+            else:
+                logger.debug("Pending orders count: %s", len(orders))
+        polls += 1
+
+        if stop_requested(poll_int):
+            logger.info("Pending-fill wait for %s cancelled.", symbol)
+            raise MonitorCancelled(symbol)
+        waited += poll_int
+    return False
+
+# SL/TP distances (USD)
+_SL_DIST = float(config.SL_DISTANCE_USD)
+_TP_DIST = float(config.TP_DISTANCE_USD)
+
+def compute_sl_tp(entry, direction):
+    """(sl, tp) prices for an entry at `entry`; SL below / TP above for longs, mirrored for shorts."""
+    sign = 1.0 if direction == "long" else -1.0
+    return entry - sign * _SL_DIST, entry + sign * _TP_DIST
+
+def scan_once(poll_interval_seconds=40, positions=None, skip_ensure=False):
+    """
+    One entry scan for config.SYMBOL. `positions` may be passed by a caller that just
+    fetched them (None -> fetch here); `skip_ensure` when the caller already ran ensure_symbol.
+    Raises MonitorCancelled if cancel_monitor() stops the pending-fill wait or the monitor.
+    """
     symbol = config.SYMBOL
-    ensure_symbol(symbol)
+    if not skip_ensure:
+        ensure_symbol(symbol)
 
     # If open position exists, log and skip new entry
-    positions = get_open_positions(symbol)
+    if positions is None:
+        positions = iter_open_positions(symbol)
     if positions:
         logger.info("Open position(s) detected — skipping new entry this candle.")
-        log_positions_summary(symbol)
+        log_positions_summary(symbol, positions)
         return False, "position_already_open"
 
     # No open position -> proceed with detection and entry
-    df_h1 = fetch_bars(symbol, config.TIMEFRAME_TREND, count=200)
-    df_entry = fetch_bars(symbol, config.TIMEFRAME_ENTRY, count=10)
+    # trend window only changes once per trend candle -> cached across entry candles/restarts
+    # strategy works on array views of the bars -> convert each fetch once
+    h1 = candles_from_df(fetch_bars_cached(symbol, config.TIMEFRAME_TREND, count=200))
+    entry = candles_from_df(fetch_bars(symbol, config.TIMEFRAME_ENTRY, count=10))
 
-    trend = analyze_trend(df_h1, config.EMAS_TREND)
+    trend = analyze_trend(h1, config.EMAS_TREND)
     logger.info(f"Detected trend: {trend}")
 
-    direction, reason, order_hint = detect_entry_15m(df_entry, trend)
+    direction, reason, order_hint = detect_entry_15m(entry, trend)
     logger.info(f"Entry detection: {direction} — {reason}  hint={order_hint}")
     if direction not in ("long", "short"):
         return False, reason
@@ -88,13 +165,6 @@ def scan_once(poll_interval_seconds=40):
     # compute tentative entry price from tick (used for market orders and some validations)
     entry_price_tick = float(tick.ask) if direction == "long" else float(tick.bid)
 
-    # compute SL/TP relative to intended entry price.
-    # If limit order is used, we'll use limit_price as entry reference for SL/TP (below).
-    entry_price_ref = entry_price_tick
-
-    sl_price_ref = (entry_price_ref - float(config.SL_DISTANCE_USD)) if direction == "long" else (entry_price_ref + float(config.SL_DISTANCE_USD))
-    tp_price_ref = (entry_price_ref + float(config.TP_DISTANCE_USD)) if direction == "long" else (entry_price_ref - float(config.TP_DISTANCE_USD))
-
     # volume handling
     volume = float(config.DEFAULT_VOLUME)
     volume = round_lot(volume)
@@ -106,6 +176,14 @@ def scan_once(poll_interval_seconds=40):
     req = None
     oh_type = order_hint.get("type") if isinstance(order_hint, dict) else "market"
 
+    # SL/TP are set relative to the intended entry: the pending price for limits, the tick otherwise
+    if oh_type == "limit":
+        limit_price = float(order_hint.get("price"))
+        entry_price_ref = limit_price
+    else:
+        entry_price_ref = entry_price_tick
+    sl_price_ref, tp_price_ref = compute_sl_tp(entry_price_ref, direction)
+
     if oh_type == "market":
         req = build_order_request(symbol, direction, volume, sl_price_ref, tp_price_ref, order_type="market")
         if req is None:
@@ -113,12 +191,6 @@ def scan_once(poll_interval_seconds=40):
             return False, "request_build_failed"
 
     elif oh_type == "limit":
-        limit_price = float(order_hint.get("price"))
-        # for pending orders, SL/TP must be set relative to the pending entry price
-        entry_price_ref = limit_price
-        sl_price_ref = (entry_price_ref - float(config.SL_DISTANCE_USD)) if direction == "long" else (entry_price_ref + float(config.SL_DISTANCE_USD))
-        tp_price_ref = (entry_price_ref + float(config.TP_DISTANCE_USD)) if direction == "long" else (entry_price_ref - float(config.TP_DISTANCE_USD))
-
         # Build a pending (limit) request via order_manager
         req = build_order_request(symbol, direction, volume, sl_price_ref, tp_price_ref, order_type="limit", limit_price=limit_price)
 
@@ -153,8 +225,6 @@ def scan_once(poll_interval_seconds=40):
         logger.info("Pending (limit) order sent — entering pending monitor (waiting for fill).")
         max_wait = int(getattr(config, "LIMIT_PENDING_MAX_WAIT_SECONDS", 1800))
         poll_int = int(getattr(config, "LIMIT_PENDING_POLL_INTERVAL", 5))
-        waited = 0
-        pending_filled = False
 
         # try to extract pending order ticket from response (defensive)
         pending_order_ticket = None
@@ -164,28 +234,17 @@ def scan_once(poll_interval_seconds=40):
         except Exception:
             pending_order_ticket = None
 
-        while waited < max_wait:
-            # check if pending converted to a position (filled)
-            positions = mt5.positions_get(symbol=symbol)
-            if positions and len(positions) > 0:
-                logger.info(f"Pending order filled -> found {len(positions)} open position(s) for {symbol}.")
-                pending_filled = True
-                break
-
-            # check if pending order still exists
+        # blocks on the monitor worker; False on timeout, MonitorCancelled on cancel_monitor()
+        try:
+            pending_filled = run_on_worker(wait_for_pending_fill, symbol, max_wait, poll_int)
+        except MonitorCancelled:
+            # stopping: don't leave an unwatched limit order behind
+            logger.info("Pending-fill wait cancelled; withdrawing pending orders for %s before stopping.", symbol)
             try:
-                orders = mt5.orders_get(symbol=symbol)
+                cancel_pending_orders_for_symbol(symbol)
             except Exception as e:
-                orders = None
-                logger.exception(f"orders_get() failed while monitoring pending: {e}")
-
-            if orders is None or len(orders) == 0:
-                logger.debug("No pending orders currently present for this symbol.")
-            else:
-                logger.debug(f"Pending orders count: {len(orders)}")
-
-            time.sleep(poll_int)
-            waited += poll_int
+                logger.exception("Failed to cancel pending orders: %s", e)
+            raise
 
         if not pending_filled:
             logger.warning(f"Pending order did NOT fill within {max_wait}s for {symbol}. Will cancel pending orders and return.")
@@ -214,6 +273,8 @@ def scan_once(poll_interval_seconds=40):
     logger.info("Blocking on monitor_position_by_symbol() until open position(s) close.")
     try:
         monitor_position_by_symbol(symbol, poll_interval=poll_interval_seconds)
+    except MonitorCancelled:
+        raise
     except Exception as e:
         logger.exception(f"position monitor raised exception: {e}")
 
@@ -222,31 +283,35 @@ def scan_once(poll_interval_seconds=40):
 
 def main_once():
     setup_logging()
+    clear_cancel()
     try:
         initialize_mt5()
         symbol = config.SYMBOL
         ensure_symbol(symbol)
 
         # 🟡 New: check for open positions first
-        positions = get_open_positions(symbol)
+        positions = iter_open_positions(symbol)
         if positions:
             logger.info(f"Detected {len(positions)} running position(s) on startup. Entering monitor mode immediately.")
-            log_positions_summary(symbol)
+            log_positions_summary(symbol, positions)
             # Block here until they close
             monitor_position_by_symbol(symbol, poll_interval=5)
             logger.info("Existing position(s) closed. Resuming normal scanning...")
-            # once closed, proceed to scanning for next setup
-            ok, res = scan_once()
+            # once closed, proceed to scanning for next setup (positions changed -> let scan_once refetch)
+            ok, res = scan_once(skip_ensure=True)
         else:
-            # no running position, proceed as usual
-            ok, res = scan_once()
+            # no running position, proceed as usual (reuse the empty fetch above)
+            ok, res = scan_once(positions=positions, skip_ensure=True)
 
         logger.info(f"Scan result: ok={ok} res={res}")
 
+    except MonitorCancelled:
+        logger.info("Stopped: monitor cancelled.")
     except Exception as e:
         logger.exception(f"Error in main: {e}")
     finally:
         shutdown_mt5()
+        stop_logging()
 
 
 if __name__ == "__main__":
@@ -1,210 +1,271 @@
 # strategy.py
-from indicators import ema
+from indicators import emas_last, ema_next, njit_if_available
 import numpy as np
 import logging
-from datetime import datetime, timezone
-import pandas as pd
+import time
+from datetime import timezone
+from typing import NamedTuple
 from config_loader import config
 
 logger = logging.getLogger("swingpilot.strategy")
 
+# candle length per timeframe string (one dict lookup instead of re-parsing per call)
+_TF_MINUTES = {"M1": 1, "M5": 5, "M15": 15, "M30": 30, "H1": 60, "H2": 120, "H4": 240}
+
+_NS = 1_000_000_000  # ns per second (Candles.time is unix seconds)
+# per-timeframe candle length and the default safety margin, in ns, so calls only add/compare ints
+_TF_SPAN_NS = {tf: m * 60 * _NS for tf, m in _TF_MINUTES.items()}
+_DEFAULT_SAFETY_NS = 1 * _NS
+
+# entry thresholds
+_BIG_THRESHOLD = float(config.LARGE_CANDLE_THRESHOLD_USD)
+_PULLBACK_PCT = float(config.LIMIT_PULLBACK_PCT)
+
+# fixed EMA schema analyze_trend classifies on
+_TREND_PERIODS = (9, 20, 50)
+_TREND_SET = frozenset(_TREND_PERIODS)
+# rows: e9 vs e20 (<, =, >); cols: e20 vs e50 (<, =, >)
+_TREND_TABLE = (
+    "true_bear", "neutral", "weak_bull",
+    "neutral", "neutral", "neutral",
+    "weak_bear", "neutral", "true_bull",
+)
+
+# last analyze_trend input/result; the newest trend bar's close is part of the key because
+# that bar is usually still forming (fetch_bars_cached refreshes it)
+_LAST_TREND = {"key": None, "value": None}
+
+# period -> (open time of the bar before the newest, EMA through that bar). The newest bar may
+# still be forming (its close moves), so the state stops one bar short and is stepped per call.
+_EMA_STATE = {}
+
+
+class Candles(NamedTuple):
+    """Bars as parallel arrays: time = int64 open time (unix seconds, UTC), OHLC = float64."""
+    time: np.ndarray
+    open: np.ndarray
+    high: np.ndarray
+    low: np.ndarray
+    close: np.ndarray
+
+
+def candles_from_df(df) -> Candles:
+    """Convert a fetched bar DataFrame once; strategy functions then only index arrays."""
+    times = df["time"]
+    if getattr(times.dt, "tz", None) is not None:
+        times = times.dt.tz_convert(timezone.utc).dt.tz_localize(None)
+    return Candles(
+        time=times.to_numpy("datetime64[s]").astype(np.int64),
+        open=df["open"].to_numpy(np.float64, copy=False),
+        high=df["high"].to_numpy(np.float64, copy=False),
+        low=df["low"].to_numpy(np.float64, copy=False),
+        close=df["close"].to_numpy(np.float64, copy=False),
+    )
+
+
+def _ohlc_rows(c, i, j):
+    return (
+        (float(c.open[i]), float(c.high[i]), float(c.low[i]), float(c.close[i])),
+        (float(c.open[j]), float(c.high[j]), float(c.low[j]), float(c.close[j])),
+    )
+
 
-def get_last_two_closed(df, timeframe, safety_seconds=1):
+def get_last_two_closed(candles, timeframe, safety_seconds=1):
     """
-    Robust: return (prev, last) = the two most recent FULLY CLOSED candles.
+    Robust: return (prev, last) = the two most recent FULLY CLOSED candles,
+    each as an (open, high, low, close) float tuple, or (None, None).
 
     Approach:
-    - compute bar end times = open_time + timeframe
+    - compute the newest bar end time = open_time + timeframe
     - check whether the final row is still forming
-    - if forming -> last closed is df.iloc[-2], prev is df.iloc[-3]
-    - else last closed is df.iloc[-1], prev is df.iloc[-2]
+    - if forming -> last closed is row -2, prev is row -3
+    - else last closed is row -1, prev is row -2
     """
-    tf = timeframe.upper()
-    if tf.startswith("M"):
-        mins = int(tf[1:])
-    elif tf.startswith("H"):
-        mins = int(tf[1:]) * 60
-    else:
+    span_ns = _TF_SPAN_NS.get(timeframe) or _TF_SPAN_NS.get(timeframe.upper())
+    if span_ns is None:
         raise ValueError("Unsupported timeframe")
 
-    now = datetime.now(timezone.utc)
+    # plain int64 nanoseconds: no datetime/Timestamp/Timedelta objects per call
+    safety_ns = _DEFAULT_SAFETY_NS if safety_seconds == 1 else int(safety_seconds * _NS)
+    forming_threshold_ns = time.time_ns() - safety_ns
 
-    # Parse timestamps
-    times = pd.to_datetime(df["time"])
-    if times.dt.tz is None:
-        times = times.dt.tz_localize(timezone.utc)
-    else:
-        times = times.dt.tz_convert(timezone.utc)
-
-    # Candle close = open + interval
-    ends = times + pd.to_timedelta(mins, unit="m")
-
-    if len(df) < 3:
+    times = candles.time
+    if len(times) < 3:
         # fallback — try selecting closed bars only
-        closed_mask = ends <= (pd.Timestamp(now) - pd.Timedelta(seconds=safety_seconds))
-        closed_df = df[closed_mask]
-        if len(closed_df) >= 2:
-            return closed_df.iloc[-2], closed_df.iloc[-1]
+        closed_mask = times * _NS + span_ns <= forming_threshold_ns
+        closed_rows = np.flatnonzero(closed_mask)
+        if len(closed_rows) >= 2:
+            return _ohlc_rows(candles, closed_rows[-2], closed_rows[-1])
         return None, None
 
-    # Check if last bar is forming
-    last_end = ends.iloc[-1]
-    forming_threshold = pd.Timestamp(now) - pd.Timedelta(seconds=safety_seconds)
-    is_forming = last_end > forming_threshold
+    # Check if last bar is forming: only the newest open time matters
+    # Candle close = open + interval
+    is_forming = int(times[-1]) * _NS + span_ns > forming_threshold_ns
 
     if is_forming:
         # last row is forming → use -3 and -2
-        if len(df) >= 3:
-            prev = df.iloc[-3]
-            last = df.iloc[-2]
-            return prev, last
-        return None, None
-    else:
-        # last row is closed → use -2 and -1
-        prev = df.iloc[-2]
-        last = df.iloc[-1]
-        return prev, last
-
-
-def analyze_trend(df_h1, emas_trend):
+        return _ohlc_rows(candles, -3, -2)
+    # last row is closed → use -2 and -1
+    return _ohlc_rows(candles, -2, -1)
+
+
+def _trend_emas(close, times, periods):
+    """Newest-bar EMA per period in O(1) when _EMA_STATE is current (or one bar behind)."""
+    if close.size < 3:
+        return emas_last(close, periods).tolist()
+    t_prev, t_prev2 = times[-2], times[-3]
+    base = {}
+    stale = []
+    for p in periods:
+        state = _EMA_STATE.get(p)
+        if state is not None and state[0] == t_prev:
+            base[p] = state[1]
+        elif state is not None and state[0] == t_prev2:
+            # one bar closed since the last call
+            base[p] = ema_next(state[1], float(close[-2]), p)
+        else:
+            stale.append(p)
+    if stale:
+        # first call / gap in bars -> full (fused) recompute through the previous bar
+        base.update(zip(stale, emas_last(close[:-1], stale).tolist()))
+    last_close = float(close[-1])
+    out = []
+    for p in periods:
+        _EMA_STATE[p] = (t_prev, base[p])
+        out.append(ema_next(base[p], last_close, p))
+    return out
+
+
+def analyze_trend(h1, emas_trend):
     """
     Return one of: 'true_bull','true_bear','weak_bull','weak_bear','neutral'
-    Uses last H1 candle's EMA values.
-    IMPORTANT: df_h1 should contain closed H1 candles (no forming bar).
+    Uses the EMA values at the newest H1 row.
+    `h1` is a Candles (see candles_from_df), oldest -> newest. The newest row may be the
+    still-forming bar: its close is re-stepped from the carried EMA state on every call,
+    so a moving live close changes the result; all earlier rows must be closed bars.
+    """
+    # only the last EMA value is used -> run the recurrence on the close array, no EMA columns
+    close = h1.close
+    # the classification reads exactly EMA 9/20/50; a config without all three was always neutral
+    if not _TREND_SET.issubset(emas_trend):
+        return "neutral"
+    key = (int(h1.time[-1]), float(close[-1]), len(close)) if len(close) else None
+    if key is not None and key == _LAST_TREND["key"]:
+        return _LAST_TREND["value"]
+    e9, e20, e50 = _trend_emas(close, h1.time, _TREND_PERIODS)
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug("H1 EMAs: 9=%s 20=%s 50=%s", e9, e20, e50)
+    # sign(e9-e20), sign(e20-e50) in {-1,0,1} (nan -> 0) index a 3x3 table instead of an if-chain
+    idx = 3 * ((e9 > e20) - (e9 < e20) + 1) + ((e20 > e50) - (e20 < e50) + 1)
+    _LAST_TREND["key"] = key
+    _LAST_TREND["value"] = _TREND_TABLE[idx]
+    return _TREND_TABLE[idx]
+
+
+# _decide() result codes -> what detect_entry_15m returns
+_DIRECTIONS = (None, "long", "short")
+_REASONS = (
+    "trend not supporting entry",
+    "bull entry with limit (big candle)",
+    "bull entry pattern valid",
+    "green low above prev low",
+    "green close below prev close",
+    "no red->green pattern",
+    "bear entry with limit (big candle)",
+    "bear entry pattern valid",
+    "red high below prev high",
+    "red close above prev close",
+    "no green->red pattern",
+)
+_TREND_CODES = {"true_bull": 1, "weak_bull": 1, "true_bear": 2, "weak_bear": 2}
+
+
+@njit_if_available("Tuple((i8, i8, i8, f8))(f8, f8, f8, f8, f8, f8, f8, f8, i8, f8, f8)")
+def _decide(prev_open, prev_high, prev_low, prev_close,
+            last_open, last_high, last_low, last_close,
+            trend_code, big_threshold, pullback_pct):
     """
-    df = df_h1.copy().reset_index(drop=True)
-    for p in emas_trend:
-        df[f"ema{p}"] = ema(df["close"], int(p))
-    last = df.iloc[-1]
-    e = {}
-    for p in emas_trend:
-        e[p] = float(last.get(f"ema{p}", np.nan))
-    e9 = e.get(9, np.nan)
-    e20 = e.get(20, np.nan)
-    e50 = e.get(50, np.nan)
-    logger.debug(f"H1 EMAs: {e}")
-    if e9 > e20 > e50:
-        return "true_bull"
-    if e9 < e20 < e50:
-        return "true_bear"
-    if e9 < e20 and e20 > e50:
-        return "weak_bull"
-    if e9 > e20 and e20 < e50:
-        return "weak_bear"
-    return "neutral"
-
-
-def candle_is_bull(c):
-    return float(c["close"]) > float(c["open"])
-
-
-def candle_is_bear(c):
-    return float(c["close"]) < float(c["open"])
-
-
-def detect_entry_15m(df_m15, trend):
+    Entry decision on the two closed candles, numbers only (no logging/objects so it can be jitted).
+    trend_code: 1 bull, 2 bear, 0 other. Returns (direction 0/1/2, reason index into _REASONS,
+    order type 0 market / 1 limit, limit price).
     """
-    Detect entry (long/short) and return:
+    tol = 1e-12
+    last_range = last_high - last_low
+    body = abs(last_close - last_open)
+
+    # -------------------------------------------
+    # BULLISH ENTRY
+    # -------------------------------------------
+    if trend_code == 1:
+        if not (prev_close < prev_open and last_close > last_open):
+            return 0, 5, 0, 0.0
+        # If big candle → use buy-limit
+        if last_range >= big_threshold and body > tol:
+            return 1, 1, 1, last_close - pullback_pct * (last_close - last_open)
+        low_ok = last_low <= prev_low + tol
+        # Normal market entry
+        if low_ok and last_close >= prev_close - tol:
+            return 1, 2, 0, 0.0
+        if not low_ok:
+            return 0, 3, 0, 0.0
+        return 0, 4, 0, 0.0
+
+    # -------------------------------------------
+    # BEARISH ENTRY
+    # -------------------------------------------
+    if trend_code == 2:
+        if not (prev_close > prev_open and last_close < last_open):
+            return 0, 10, 0, 0.0
+        # If big candle → use sell-limit
+        if last_range >= big_threshold and body > tol:
+            return 2, 6, 1, last_close + pullback_pct * (last_open - last_close)
+        high_ok = last_high >= prev_high - tol
+        # Market entry
+        if high_ok and last_close <= prev_close + tol:
+            return 2, 7, 0, 0.0
+        if not high_ok:
+            return 0, 8, 0, 0.0
+        return 0, 9, 0, 0.0
+
+    return 0, 0, 0, 0.0
+
+
+def detect_entry_15m(m15, trend):
+    """
+    Detect entry (long/short) on `m15` (a Candles, see candles_from_df) and return:
         direction, reason, order_hint
 
     order_hint:
         {"type": "market"}
         {"type": "limit", "price": float}
     """
-    tol = 1e-12
+    # ranging market (the common case) -> no candle work at all
+    trend_code = _TREND_CODES.get(trend, 0)
+    if not trend_code:
+        return None, _REASONS[0], {"type": "market"}
 
-    prev, last = get_last_two_closed(df_m15, "M15")
+    prev, last = get_last_two_closed(m15, "M15")
     if prev is None or last is None:
         return None, "not enough closed bars", {"type": "market"}
+    prev_open, prev_high, prev_low, prev_close = prev
+    last_open, last_high, last_low, last_close = last
 
     # DEBUG log (keeps your existing verbose info)
     logger.info(
-        f"[CandleCheck] prev_close={float(prev['close']):.6f} last_close={float(last['close']):.6f} "
-        f"prev_low={float(prev['low']):.6f} last_low={float(last['low']):.6f} "
-        f"prev_high={float(prev['high']):.6f} last_high={float(last['high']):.6f}"
+        "[CandleCheck] prev_close=%.6f last_close=%.6f prev_low=%.6f last_low=%.6f prev_high=%.6f last_high=%.6f",
+        prev_close, last_close, prev_low, last_low, prev_high, last_high,
     )
 
-    # config values (make sure these keys are present in config.json)
-    big_threshold = float(getattr(config, "LARGE_CANDLE_THRESHOLD_USD", 7.0))
-    pullback_pct = float(getattr(config, "LIMIT_PULLBACK_PCT", 0.30))
-
-    last_high = float(last["high"])
-    last_low = float(last["low"])
-    last_open = float(last["open"])
-    last_close = float(last["close"])
-
-    last_range = last_high - last_low
-    body = abs(last_close - last_open)
-
-    # -------------------------------------------
-    # BULLISH ENTRY
-    # -------------------------------------------
-    if trend in ("true_bull", "weak_bull"):
-        if candle_is_bear(prev) and candle_is_bull(last):
-
-            prev_low = float(prev["low"])
-            prev_close = float(prev["close"])
-
-            # Condition for market entry
-            valid_market = (
-                last_low <= prev_low + tol
-                and last_close >= prev_close - tol
-            )
-
-            # If big candle → use buy-limit
-            if last_range >= big_threshold and body > tol:
-                limit_price = last_close - pullback_pct * (last_close - last_open)
-                logger.info(
-                    f"[BullLimit] Big candle detected (range={last_range:.6f}). Using BUY LIMIT at {limit_price:.6f}"
-                )
-                return "long", "bull entry with limit (big candle)", {
-                    "type": "limit",
-                    "price": float(limit_price)
-                }
-
-            # Normal market entry
-            if valid_market:
-                return "long", "bull entry pattern valid", {"type": "market"}
-
-            if not (last_low <= prev_low + tol):
-                return None, "green low above prev low", {"type": "market"}
-            return None, "green close below prev close", {"type": "market"}
-
-        return None, "no red->green pattern", {"type": "market"}
-
-    # -------------------------------------------
-    # BEARISH ENTRY
-    # -------------------------------------------
-    if trend in ("true_bear", "weak_bear"):
-        if candle_is_bull(prev) and candle_is_bear(last):
-
-            prev_high = float(prev["high"])
-            prev_close = float(prev["close"])
-
-            valid_market = (
-                last_high >= prev_high - tol
-                and last_close <= prev_close + tol
-            )
-
-            # If big candle → use sell-limit
-            if last_range >= big_threshold and body > tol:
-                limit_price = last_close + pullback_pct * (last_open - last_close)
-                logger.info(
-                    f"[BearLimit] Big candle detected (range={last_range:.6f}). Using SELL LIMIT at {limit_price:.6f}"
-                )
-                return "short", "bear entry with limit (big candle)", {
-                    "type": "limit",
-                    "price": float(limit_price)
-                }
-
-            # Market entry
-            if valid_market:
-                return "short", "bear entry pattern valid", {"type": "market"}
-
-            if not (last_high >= prev_high - tol):
-                return None, "red high below prev high", {"type": "market"}
-            return None, "red close above prev close", {"type": "market"}
-
-        return None, "no green->red pattern", {"type": "market"}
-
-    return None, "trend not supporting entry", {"type": "market"}
+    direction, reason, order_type, limit_price = _decide(
+        prev_open, prev_high, prev_low, prev_close,
+        last_open, last_high, last_low, last_close,
+        trend_code, _BIG_THRESHOLD, _PULLBACK_PCT,
+    )
+    if order_type == 1:
+        logger.info(
+            "[%s] Big candle detected (range=%.6f). Using %s LIMIT at %.6f",
+            "BullLimit" if direction == 1 else "BearLimit", last_high - last_low,
+            "BUY" if direction == 1 else "SELL", limit_price,
+        )
+        return _DIRECTIONS[direction], _REASONS[reason], {"type": "limit", "price": limit_price}
+    return _DIRECTIONS[direction], _REASONS[reason], {"type": "market"}